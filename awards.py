@@ -0,0 +1,116 @@
+import numpy as np
+import pandas as pd
+from config import AWARDS_CONFIG
+
+# Premi a classifica: posizione (0 = primo) nel numero di eventi
+RANK_AWARDS = ['gold', 'silver', 'bronze', 'wood']
+# Premi agli estremi: (chiave, colonna, segno) → vince il valore massimo di segno * coordinata
+EXTREME_AWARDS = [('north', 'lat', 1), ('south', 'lat', -1), ('east', 'lon', 1), ('west', 'lon', -1)]
+AWARD_KEYS = RANK_AWARDS + ['globetrotter'] + [key for key, _, _ in EXTREME_AWARDS]
+
+class AwardsEngine:
+    # Stato cumulato tra un blocco di eventi e il successivo (come DominanceEngine):
+    # conteggi, coppie (utente, stato) già viste, record degli estremi e ultimo step emesso.
+    # A parità vince l'utente che viene prima in unique_users (classifica e globetrotter);
+    # un record di coordinate passa di mano solo se superato strettamente.
+    def __init__(self, n_users):
+        self.n_users = n_users
+        self.counts = np.zeros(n_users, dtype=np.int64)
+        self.distinct = np.zeros(n_users, dtype=np.int64)
+        self.country_codes = {}
+        self.seen_pairs = np.zeros((0, n_users), dtype=bool)
+        self.best = {key: (-np.inf, -1) for key, _, _ in EXTREME_AWARDS}
+        self.last_xp = np.zeros(n_users, dtype=np.int64)
+        self.last_holders = {key: -1 for key in AWARD_KEYS}
+
+    def add(self, steps, users, countries, lats, lons):
+        # steps/users: codici interi per evento (ordinati per tempo). Ritorna, per ogni step del blocco,
+        # (step, XP totale per utente [S x U], detentore di ogni premio {chiave: array S}, -1 = nessuno)
+        steps = np.asarray(steps, dtype=np.int64)
+        users = np.asarray(users, dtype=np.int64)
+        if not len(steps):
+            return steps, np.zeros((0, self.n_users), dtype=np.int64), {key: steps for key in AWARD_KEYS}
+
+        step_ids, local = np.unique(steps, return_inverse=True)
+        last = np.r_[np.flatnonzero(np.diff(local)), len(local) - 1]
+        n_steps = len(step_ids)
+
+        # Eventi per utente a fine step (somma cumulata sugli step, non sugli eventi)
+        per_step = np.zeros((n_steps, self.n_users), dtype=np.int64)
+        np.add.at(per_step, (local, users), 1)
+        counts = self.counts + np.cumsum(per_step, axis=0)
+
+        # Stati distinti: solo la prima comparsa di ogni coppia (utente, stato) conta
+        # Nomi o categoriale (tabella compatta): in entrambi i casi si lavora sui codici
+        countries = pd.Categorical(countries)
+        known = np.asarray(countries != "Unknown")
+        codes = self._encode(countries[known])
+        first = ~self.seen_pairs[codes, users[known]] & ~pd.Series(codes * self.n_users + users[known]).duplicated().to_numpy()
+        new_pairs = np.zeros((n_steps, self.n_users), dtype=np.int64)
+        np.add.at(new_pairs, (local[known][first], users[known][first]), 1)
+        distinct = self.distinct + np.cumsum(new_pairs, axis=0)
+        self.seen_pairs[codes, users[known]] = True
+
+        holders = {}
+        # Classifica: ordinamento stabile per eventi decrescenti, quindi a pari merito l'ordine di unique_users
+        order = np.argsort(-counts, axis=1, kind='stable')
+        rows = np.arange(n_steps)
+        for rank, key in enumerate(RANK_AWARDS[:self.n_users]):
+            holder = order[:, rank]
+            holders[key] = np.where(counts[rows, holder] > 0, holder, -1)
+        for key in RANK_AWARDS[self.n_users:]:
+            holders[key] = np.full(n_steps, -1)
+        globetrotter = np.argmax(distinct, axis=1)
+        holders['globetrotter'] = np.where(distinct[rows, globetrotter] > 0, globetrotter, -1)
+
+        # Estremi: massimo cumulato evento per evento, detentore = autore del record ancora in piedi
+        coords = {'lat': np.asarray(lats, dtype=float), 'lon': np.asarray(lons, dtype=float)}
+        for key, column, sign in EXTREME_AWARDS:
+            values = np.nan_to_num(sign * coords[column], nan=-np.inf)
+            best_value, best_holder = self.best[key]
+            running = np.maximum.accumulate(np.r_[best_value, values])
+            is_record = values > running[:-1]
+            pos = np.maximum.accumulate(np.where(is_record, np.arange(len(values)), -1))
+            holder = np.where(pos >= 0, users[np.maximum(pos, 0)], best_holder)
+            holders[key] = holder[last]
+            self.best[key] = (running[-1], int(holder[-1]))
+
+        # XP = base per evento + premi detenuti a fine step
+        xp = AWARDS_CONFIG['base_poop'][2] * counts
+        for key in AWARD_KEYS:
+            held = holders[key] >= 0
+            xp[rows[held], holders[key][held]] += AWARDS_CONFIG[key][2]
+
+        self.counts = counts[-1]
+        self.distinct = distinct[-1]
+        return step_ids, xp, holders
+
+    def changes(self, xp, holders):
+        # Variazioni step per step rispetto all'ultimo step emesso: [(cambi XP, cambi premi)] in codici utente
+        previous = np.vstack([self.last_xp, xp[:-1]])
+        xp_changes = [{} for _ in range(len(xp))]
+        for row, user in zip(*np.nonzero(xp != previous)):
+            xp_changes[row][int(user)] = int(xp[row, user])
+
+        award_changes = [{} for _ in range(len(xp))]
+        for key in AWARD_KEYS:
+            values = holders[key]
+            before = np.r_[self.last_holders[key], values[:-1]]
+            for row in np.flatnonzero(values != before):
+                award_changes[row][key] = int(values[row])
+            if len(values):
+                self.last_holders[key] = int(values[-1])
+        if len(xp):
+            self.last_xp = xp[-1].copy()
+        return xp_changes, award_changes
+
+    def _encode(self, names):
+        # Codici degli stati in ordine di prima comparsa (la matrice delle coppie viste cresce con loro)
+        local_codes, uniques = pd.factorize(names)
+        mapping = np.empty(len(uniques), dtype=np.int64)
+        for i, name in enumerate(uniques):
+            mapping[i] = self.country_codes.setdefault(name, len(self.country_codes))
+        grow = len(self.country_codes) - len(self.seen_pairs)
+        if grow > 0:
+            self.seen_pairs = np.vstack([self.seen_pairs, np.zeros((grow, self.n_users), dtype=bool)])
+        return mapping[local_codes]
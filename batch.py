@@ -0,0 +1,102 @@
+import os
+import gc
+import argparse
+import glob
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from config import MAP_RENDERER, MAP_RENDERERS, TIMELINE_GRANULARITY, BATCH_WORKERS, BATCH_OUTPUT_DIR, GEO_CACHE_ENABLED
+from data_loader import load_chat_data
+from event_store import EVENT_COLUMNS, assign_countries, concat_events
+from geo_engine import GeoEngine, CountryCache
+from main import render_map
+from map_geometry import prepare_map_geometry, prepare_region_geometry
+from timeline import build_timeline
+
+# Motore geografico del processo: nel padre prima del fork, i figli lo ereditano (copy-on-write) invece di ricostruirlo
+_geo_engine = None
+
+def _init_worker():
+    global _geo_engine
+    if _geo_engine is None:
+        # Avvio "spawn" (Windows, macOS): ogni worker lo ricostruisce dalla cache binaria dei poligoni
+        _geo_engine = GeoEngine(use_cache=False)
+    # La cache punto → stato su SQLite non si usa dopo il fork: se abilitata, una in memoria per worker
+    # (inesatta ai confini come in main.py); altrimenti ricerca esatta sui poligoni
+    _geo_engine.cache = CountryCache() if GEO_CACHE_ENABLED else None
+
+def find_chats(chat_dir):
+    # Un export per file (.txt), oppure una cartella per gruppo con dentro _chat.txt (export WhatsApp estratto)
+    chats = sorted(glob.glob(os.path.join(chat_dir, '*.txt')) + glob.glob(os.path.join(chat_dir, '*', '_chat.txt')))
+    return {chat_name(chat_dir, path): path for path in chats}
+
+def chat_name(chat_dir, path):
+    rel = os.path.relpath(path, chat_dir)
+    return os.path.dirname(rel) if os.path.basename(rel) == '_chat.txt' else os.path.splitext(rel)[0]
+
+def process_chat(name, chat_file, output_dir, renderer, granularity):
+    t0 = time.perf_counter()
+    df = load_chat_data(chat_file, streaming=True, workers=1)
+    assign_countries(df, _geo_engine)
+    if len(df):
+        timeline = build_timeline(df, sorted(df['User'].unique()))
+        render_map(df, timeline, _geo_engine, os.path.join(output_dir, f"{name}.html"), renderer=renderer,
+                   granularity=granularity, open_browser=False)
+    return name, df[[c for c in EVENT_COLUMNS if c in df]], time.perf_counter() - t0
+
+def run_batch(chat_dir, output_dir=BATCH_OUTPUT_DIR, workers=BATCH_WORKERS, renderer=MAP_RENDERER,
+              granularity=TIMELINE_GRANULARITY, combined=True):
+    global _geo_engine
+    chats = find_chats(chat_dir)
+    if not chats:
+        raise FileNotFoundError(f"⚠️ ERRORE: nessuna chat (.txt o */_chat.txt) in '{chat_dir}'")
+    os.makedirs(output_dir, exist_ok=True)
+    workers = min(workers or os.cpu_count() or 1, len(chats))
+    t0 = time.perf_counter()
+
+    # Poligoni, indice spaziale e livelli semplificati della mappa: una volta sola, prima di creare i processi
+    _geo_engine = GeoEngine(use_cache=False)
+    prepare_map_geometry(_geo_engine)
+    prepare_region_geometry(_geo_engine)
+
+    print(f"📦 {len(chats)} chat con {workers} processi...")
+    if workers == 1:
+        _init_worker()
+        results = [process_chat(name, path, output_dir, renderer, granularity) for name, path in chats.items()]
+    else:
+        fork = 'fork' in multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('fork' if fork else 'spawn')
+        if fork:
+            # Oggetti del padre fuori dal garbage collector: i figli non toccano (e quindi non copiano) le loro pagine
+            gc.freeze()
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker) as pool:
+            futures = [pool.submit(process_chat, name, path, output_dir, renderer, granularity) for name, path in chats.items()]
+            results = [f.result() for f in futures]
+        if fork:
+            gc.unfreeze()
+
+    for name, events, elapsed in results:
+        print(f"   {name}: {len(events)} eventi in {elapsed:.1f} s")
+
+    if combined:
+        # Mappa di tutti i gruppi insieme: stessa persona in più chat = un solo giocatore
+        events = concat_events([events for _, events, _ in results])
+        if len(events):
+            timeline = build_timeline(events, sorted(events['User'].unique()))
+            render_map(events, timeline, _geo_engine, os.path.join(output_dir, "Mappa_Combinata.html"), renderer=renderer,
+                       granularity=granularity, open_browser=False)
+
+    elapsed = time.perf_counter() - t0
+    print(f"🏁 {len(chats)} mappe in {elapsed:.1f} s ({len(chats) / elapsed:.2f} chat/s) in {output_dir}")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Una mappa per ogni chat di una cartella (in parallelo) più una combinata")
+    parser.add_argument('chat_dir', help="Cartella con gli export (.txt) o con una sottocartella per gruppo (_chat.txt)")
+    parser.add_argument('--output', default=BATCH_OUTPUT_DIR, help="Cartella delle mappe generate")
+    parser.add_argument('--workers', type=int, default=BATCH_WORKERS, help="Processi (default: tutti i core)")
+    parser.add_argument('--renderer', choices=MAP_RENDERERS, default=MAP_RENDERER)
+    parser.add_argument('--granularity', default=TIMELINE_GRANULARITY)
+    parser.add_argument('--no-combined', dest='combined', action='store_false', help="Salta la mappa combinata")
+    args = parser.parse_args()
+    run_batch(args.chat_dir, args.output, args.workers, args.renderer, args.granularity, args.combined)
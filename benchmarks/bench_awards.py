@@ -0,0 +1,50 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from awards import AwardsEngine
+from synthetic_chat import make_events
+
+def run_awards(df, unique_users, blocks=1):
+    # Stesso input che gli passa TimelineBuilder: codici di step e utente per evento, in ordine di tempo
+    df = df.sort_values(by='Timestamp', kind='stable')
+    steps = pd.factorize(df['Timestamp'].dt.strftime('%Y-%m-%d %H:%M'))[0]
+    users = pd.Categorical(df['User'], categories=unique_users).codes.astype(np.int64)
+    countries = df['Country'].to_numpy(dtype=object)
+    lats, lons = df['Latitude'].to_numpy(), df['Longitude'].to_numpy()
+
+    engine = AwardsEngine(len(unique_users))
+    xp_changes, award_changes = [], []
+    # Blocchi tagliati sui confini di step, come fra un'esecuzione incrementale e la successiva
+    cuts = np.searchsorted(steps, np.linspace(0, steps[-1] + 1, blocks + 1).astype(int))
+    for a, b in zip(cuts[:-1], cuts[1:]):
+        _, xp, holders = engine.add(steps[a:b], users[a:b], countries[a:b], lats[a:b], lons[a:b])
+        block_xp, block_awards = engine.changes(xp, holders)
+        xp_changes += block_xp
+        award_changes += block_awards
+    return xp_changes, award_changes
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del motore premi/XP (deve crescere linearmente con gli eventi)")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--blocks', type=int, default=10,
+                        help="Blocchi in cui spezzare gli eventi per il confronto con il calcolo in un colpo solo")
+    args = parser.parse_args()
+
+    print(f"{'eventi':>10} {'step':>10} {'tempo (s)':>10} {'µs/evento':>10}  blocchi identici")
+    for n in args.sizes:
+        df = make_events(n, n_countries=7, max_gap=2400, spread='italy')
+        unique_users = sorted(df['User'].unique())
+        t0 = time.perf_counter()
+        whole = run_awards(df, unique_users)
+        elapsed = time.perf_counter() - t0
+        same = run_awards(df, unique_users, args.blocks) == whole
+        print(f"{n:>10} {len(whole[0]):>10} {elapsed:>10.2f} {elapsed / n * 1e6:>10.2f}  {same}")
+
+if __name__ == "__main__":
+    main()
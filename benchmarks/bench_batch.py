@@ -0,0 +1,59 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import map_geometry
+from batch import run_batch, process_chat, find_chats
+from geo_engine import GeoEngine
+from synthetic_chat import write_chat
+
+def naive(chats, output_dir):
+    # Come lanciare main.py una volta per gruppo: motore geografico e livelli della mappa ricostruiti ogni volta
+    import batch
+    os.makedirs(output_dir, exist_ok=True)
+    for name, path in chats.items():
+        map_geometry._levels_memo.clear()
+        batch._geo_engine = GeoEngine(use_cache=False)
+        batch._init_worker()
+        process_chat(name, path, output_dir, 'webgl', 'minute')
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput della modalità batch al variare dei processi. "
+                                                 "Va lanciato dalla cartella che contiene il GeoJSON")
+    parser.add_argument('--chats', type=int, default=8)
+    parser.add_argument('--messages', type=int, default=20_000, help="Messaggi per chat")
+    parser.add_argument('--workers', type=int, nargs='+', default=None, help="Default: 1, 2, 4... fino ai core disponibili")
+    args = parser.parse_args()
+    cpus = os.cpu_count() or 1
+    workers = args.workers or sorted({1, cpus} | {w for w in (2, 4, 8, 16, 32) if w < cpus})
+
+    with tempfile.TemporaryDirectory() as tmp:
+        chat_dir = os.path.join(tmp, 'chats')
+        os.makedirs(chat_dir)
+        for k in range(args.chats):
+            write_chat(os.path.join(chat_dir, f"gruppo_{k}.txt"), args.messages, seed=k)
+
+        t0 = time.perf_counter()
+        naive(find_chats(chat_dir), os.path.join(tmp, 'naive'))
+        naive_s = time.perf_counter() - t0
+
+        rows = []
+        for w in workers:
+            t0 = time.perf_counter()
+            run_batch(chat_dir, os.path.join(tmp, f"out_{w}"), workers=w, renderer='webgl', combined=False)
+            rows.append((w, time.perf_counter() - t0))
+
+    print(f"\n{args.chats} chat da {args.messages} messaggi, {cpus} core")
+    print(f"{'processi':>9} {'tempo (s)':>10} {'chat/s':>8} {'speedup':>8} {'efficienza':>11}")
+    print(f"{'main.py':>9} {naive_s:>10.2f} {args.chats / naive_s:>8.2f} {'-':>8} {'-':>11}")
+    base = rows[0][1] * rows[0][0]
+    for w, elapsed in rows:
+        speedup = base / elapsed
+        print(f"{w:>9} {elapsed:>10.2f} {args.chats / elapsed:>8.2f} {speedup:>7.2f}x {speedup / w:>10.0%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dominance import DominanceEngine
+from synthetic_chat import make_events
+
+def dominance_inputs(n, n_countries, n_users):
+    # Step = minuto dell'evento (in media due eventi per step), utenti come codici
+    df = make_events(n, n_users=n_users, n_countries=n_countries, max_gap=60)
+    steps = pd.factorize(df['Timestamp'].to_numpy().astype('datetime64[m]'))[0]
+    users = pd.Categorical(df['User']).codes.astype(np.int64)
+    return steps, df['Country'].to_numpy(dtype=object), users
+
+def legacy_winners(steps, countries, users):
+    # Vecchio schema: dict di dict e max() su tutti gli stati a ogni step
+    accum = {}
+    winners_by_step = {}
+    bounds = np.r_[0, np.flatnonzero(np.diff(steps)) + 1, len(steps)]
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        for c, u in zip(countries[lo:hi], users[lo:hi]):
+            if c != "Unknown":
+                accum.setdefault(c, {})
+                accum[c][u] = accum[c].get(u, 0) + 1
+        winners_by_step[steps[lo]] = {c: max(cont, key=cont.get) for c, cont in accum.items()}
+    return winners_by_step
+
+def engine_winners(steps, countries, users, n_users):
+    engine = DominanceEngine(n_users)
+    changes = engine.add(steps, countries, users)
+    return engine, changes
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark motore di dominio (dict + max vs DominanceEngine)")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--countries', type=int, default=250)
+    parser.add_argument('--users', type=int, default=11)
+    parser.add_argument('--legacy-max', type=int, default=100_000)
+    args = parser.parse_args()
+
+    print(f"{'eventi':>10} {'dict + max (s)':>15} {'engine (s)':>11} {'speedup':>9}  vincitori identici")
+    for n in args.sizes:
+        steps, countries, users = dominance_inputs(n, args.countries, args.users)
+        t0 = time.perf_counter()
+        engine, changes = engine_winners(steps, countries, users, args.users)
+        t_engine = time.perf_counter() - t0
+
+        if n > args.legacy_max:
+            print(f"{n:>10} {'-':>15} {t_engine:>11.2f} {'-':>9}  -")
+            continue
+
+        t0 = time.perf_counter()
+        legacy = legacy_winners(steps, countries, users)
+        t_legacy = time.perf_counter() - t0
+
+        # Ricostruzione dello stato per step dai soli cambi e confronto con il vecchio calcolo
+        state = {}
+        rebuilt = {}
+        order = np.argsort(changes[0], kind='stable')
+        by_step = {}
+        for s, c, w in changes[:, order].T.tolist():
+            by_step.setdefault(s, []).append((engine.country_names[c], w))
+        for s in legacy:
+            state.update(by_step.get(s, []))
+            rebuilt[s] = dict(state)
+        same = all(list(rebuilt[s].items()) == list(legacy[s].items()) for s in legacy)
+        print(f"{n:>10} {t_legacy:>15.2f} {t_engine:>11.2f} {t_legacy / t_engine:>8.0f}x  {same}")
+
+if __name__ == "__main__":
+    main()
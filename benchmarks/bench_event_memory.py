@@ -0,0 +1,75 @@
+import os
+import re
+import sys
+import json
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import data_loader
+from event_store import assign_countries, event_coords
+from geo_engine import GeoEngine
+from timeline import build_timeline
+from synthetic_chat import write_chat
+
+def load_previous(path):
+    # Versione precedente: il DataFrame che arrivava a main.py, con testo, data, ora e link come stringhe,
+    # nomi e stati ripetuti riga per riga, coordinate float64 e indice dei messaggi
+    with open(path, 'r', encoding='utf-8') as f:
+        matches = re.findall(data_loader.MESSAGE_PATTERN, f.read(), re.MULTILINE)
+    df = pd.DataFrame([{'Date_Str': m[0], 'Time_Str': m[1], 'User': m[2].strip(), 'Message_Content': m[3].strip()} for m in matches])
+    df['Timestamp'] = pd.to_datetime(df['Date_Str'] + ' ' + df['Time_Str'], format='%d/%m/%y %H:%M:%S', errors='coerce')
+    df['Is_Poop'] = df['Message_Content'].str.contains('💩', regex=False)
+    df['Location'] = np.where(
+        (df['Message_Content'].str.contains(r'Posizione:|maps', regex=True).shift(-1) == True) &
+        (df['User'].shift(-1) == df['User']),
+        df['Message_Content'].shift(-1), None
+    )
+    df = df[df['Is_Poop'] == True].copy()
+    df['Latitude'], df['Longitude'] = data_loader.extract_coords(df['Location'])
+    return data_loader.normalize_users(df.dropna(subset=['Latitude', 'Longitude']))
+
+def bytes_per_event(df):
+    # Byte per evento di ogni colonna (stringhe e categorie comprese) e dell'indice
+    usage = df.memory_usage(deep=True, index=True) / max(len(df), 1)
+    return usage.to_dict()
+
+def page_data(df):
+    timeline = build_timeline(df, sorted(df['User'].unique()))
+    return json.dumps(timeline.payload() + timeline.awards_payload())
+
+def main():
+    parser = argparse.ArgumentParser(description="Memoria per evento della tabella eventi: versione precedente vs compatta. "
+                                                 "Va lanciato dalla cartella che contiene il GeoJSON")
+    parser.add_argument('--messages', type=int, default=1_000_000)
+    parser.add_argument('--spread', default='europe')
+    args = parser.parse_args()
+    geo_engine = GeoEngine()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, '_chat.txt')
+        write_chat(path, args.messages, spread=args.spread)
+        before = load_previous(path)
+        before['Country'] = geo_engine.get_countries(before['Latitude'].to_numpy(), before['Longitude'].to_numpy())
+        after = assign_countries(data_loader.load_chat_data(path, streaming=True, workers=1), geo_engine)
+
+    # Stessi eventi, stesse coordinate (i link hanno al più 7 decimali) e stessa pagina
+    assert len(before) == len(after)
+    lats, lons = event_coords(after)
+    assert (lats == before['Latitude'].to_numpy()).all() and (lons == before['Longitude'].to_numpy()).all()
+    assert page_data(before) == page_data(after)
+
+    old, new = bytes_per_event(before), bytes_per_event(after)
+    print(f"\n{len(after)} eventi da {args.messages} messaggi: dati della pagina identici\n")
+    print(f"{'colonna':<16} {'prima (B/evento)':>17} {'dopo (B/evento)':>16}  tipo dopo")
+    for column in list(old) + [c for c in new if c not in old]:
+        dtype = str(after[column].dtype).split('(')[0] if column in after else ('RangeIndex' if column == 'Index' else '-')
+        print(f"{column:<16} {old.get(column, 0):>17.1f} {new.get(column, 0):>16.1f}  {dtype}")
+    total_old, total_new = sum(old.values()), sum(new.values())
+    print(f"{'totale':<16} {total_old:>17.1f} {total_new:>16.1f}  ({total_old / total_new:.1f}x meno)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from geo_engine import GeoEngine
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark assegnazione stati (get_country vs get_countries)")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--loop-max', type=int, default=10_000,
+                        help="Dimensione massima su cui eseguire anche get_country punto per punto")
+    args = parser.parse_args()
+
+    geo_engine = GeoEngine()
+    rng = np.random.default_rng(0)
+
+    print(f"{'punti':>10} {'get_country (s)':>16} {'get_countries (s)':>18} {'speedup':>9}  identico")
+    for n in args.sizes:
+        # Metà dei punti concentrati in Europa, metà sparsi nel mondo
+        lats = np.r_[rng.uniform(36.0, 60.0, n // 2), rng.uniform(-60.0, 75.0, n - n // 2)]
+        lons = np.r_[rng.uniform(-10.0, 30.0, n // 2), rng.uniform(-180.0, 180.0, n - n // 2)]
+
+        t0 = time.perf_counter()
+        bulk = geo_engine.get_countries(lats, lons)
+        t_bulk = time.perf_counter() - t0
+
+        if n <= args.loop_max:
+            t0 = time.perf_counter()
+            loop = [geo_engine.get_country(lat, lon) for lat, lon in zip(lats, lons)]
+            t_loop = time.perf_counter() - t0
+            same = bool((bulk == np.array(loop, dtype=object)).all())
+            print(f"{n:>10} {t_loop:>16.2f} {t_bulk:>18.2f} {t_loop / t_bulk:>8.0f}x  {same}")
+        else:
+            print(f"{n:>10} {'-':>16} {t_bulk:>18.2f} {'-':>9}  -")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import GEOMETRY_CACHE_FILE
+from geo_engine import GeoEngine
+
+def timed_startup():
+    t0 = time.perf_counter()
+    GeoEngine(use_cache=False)
+    return time.perf_counter() - t0
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark avvio GeoEngine a freddo (senza cache poligoni) e a caldo")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    cold, warm = [], []
+    for _ in range(args.repeat):
+        if os.path.exists(GEOMETRY_CACHE_FILE):
+            os.remove(GEOMETRY_CACHE_FILE)
+        cold.append(timed_startup())
+        warm.append(timed_startup())
+
+    print(f"a freddo: {min(cold):.3f} s (json.load + shape() + scrittura cache)")
+    print(f"a caldo:  {min(warm):.3f} s (WKB da {GEOMETRY_CACHE_FILE}, {os.path.getsize(GEOMETRY_CACHE_FILE) / 1e6:.1f} MB)")
+    print(f"speedup:  {min(cold) / min(warm):.1f}x")
+
+if __name__ == "__main__":
+    main()
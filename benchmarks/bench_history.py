@@ -0,0 +1,73 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from history import EventHistory
+from synthetic_chat import make_events
+
+def brute_owners(df, at):
+    # Riferimento: filtro + conteggi, spareggio sulla prima comparsa (ordine per tempo, stabile)
+    df = df[df['Timestamp'].notna()].sort_values(by='Timestamp', kind='stable').reset_index(drop=True)
+    df = df[(df['Timestamp'] <= at) & (df['Country'] != "Unknown")]
+    stats = df.reset_index().groupby(['Country', 'User'])['index'].agg(['size', 'first']).reset_index()
+    stats = stats.sort_values(['Country', 'size', 'first'], ascending=[True, False, True])
+    return dict(stats.groupby('Country').first()['User'])
+
+def brute_leaderboard(df, start, end):
+    counts = df[(df['Timestamp'] >= start) & (df['Timestamp'] <= end)]['User'].value_counts()
+    return {u: c for u, c in counts.items() if c}
+
+def timed(fn, queries):
+    latencies = []
+    for q in queries:
+        t0 = time.perf_counter()
+        fn(q)
+        latencies.append(time.perf_counter() - t0)
+    return np.array(latencies) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Costruzione e latenza delle query di history.EventHistory")
+    parser.add_argument('--events', type=int, default=1_000_000)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--check', type=int, default=5, help="Query confrontate con il calcolo diretto in pandas")
+    args = parser.parse_args()
+
+    # Attività e stati sbilanciati, qualche "Unknown" e qualche riga senza orario
+    df = make_events(args.events, max_gap=300, missing_time_rate=0.001)
+    t0 = time.perf_counter()
+    history = EventHistory(df)
+    build = time.perf_counter() - t0
+    print(f"🏗️ {len(history)} eventi indicizzati in {build:.2f} s")
+
+    rng = np.random.default_rng(1)
+    first, last = df['Timestamp'].min(), df['Timestamp'].max()
+    instants = [first + (last - first) * x for x in rng.random(args.queries)]
+    ranges = [tuple(sorted(pair)) for pair in zip(instants, instants[::-1])]
+    top = df['Country'].value_counts().index[0]
+
+    for k in range(args.check):
+        at = instants[k]
+        assert history.owners(at) == brute_owners(df, at), at
+        start, end = ranges[k]
+        assert dict(history.leaderboard(start, end)) == brute_leaderboard(df, start, end), (start, end)
+    t0 = time.perf_counter()
+    brute_owners(df, instants[0])
+    brute = (time.perf_counter() - t0) * 1000
+    print(f"✅ {args.check} query identiche al calcolo diretto (che impiega {brute:.0f} ms per owners)")
+
+    print(f"\n{'query':<22} {'mediana (ms)':>13} {'p99 (ms)':>9}")
+    for name, fn, queries in [
+        ('owner(stato, t)', lambda t: history.owner(top, t), instants),
+        ('owners(t)', history.owners, instants),
+        ('leaderboard(t0, t1)', lambda r: history.leaderboard(*r), ranges),
+        ('country_counts(t0, t1)', lambda r: history.country_counts(top, *r), ranges),
+    ]:
+        latencies = timed(fn, queries)
+        print(f"{name:<22} {np.median(latencies):>13.3f} {np.percentile(latencies, 99):>9.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import os
+import sys
+import json
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import PASTEL_HEX_MAP, USER_CONFIG
+from timeline import TimelineBuilder, KEYFRAME_EVERY
+from map_builder import create_map
+from synthetic_chat import make_events
+
+def html_size(geo_data, js_data, out_dir, name):
+    output_file = os.path.join(out_dir, name)
+    create_map(geo_data, js_data, output_file, open_browser=False)
+    return os.path.getsize(output_file)
+
+def main():
+    parser = argparse.ArgumentParser(description="Dimensione dell'HTML: stato completo per step vs keyframe + variazioni")
+    parser.add_argument('--events', type=int, default=50_000)
+    parser.add_argument('--countries', type=int, default=150)
+    parser.add_argument('--keyframe-every', type=int, default=KEYFRAME_EVERY)
+    args = parser.parse_args()
+
+    # Storia lunga: quasi ogni evento cade in un minuto diverso
+    df = make_events(args.events, n_countries=args.countries, max_gap=7200, skew=1.2)
+    unique_users = sorted(df['User'].unique())
+    timeline = TimelineBuilder(unique_users).add(df)
+    timeline_dates, data_by_time, dominance_by_time, user_totals_by_time = timeline.result()
+    _, _, dominance_payload, totals_payload = timeline.payload(args.keyframe_every)
+
+    js_dates = json.dumps(timeline_dates)
+    js_points = json.dumps(data_by_time)
+    js_colors = json.dumps({u: PASTEL_HEX_MAP.get(USER_CONFIG.get(u, {}).get('color'), 'gray') for u in unique_users})
+    full = (json.dumps(dominance_by_time), json.dumps(user_totals_by_time))
+    delta = (json.dumps(dominance_payload), json.dumps(totals_payload))
+
+    # GeoJSON minimo: interessa solo il peso dei dati della timeline
+    geo_data = {"type": "FeatureCollection", "features": [{
+        "type": "Feature", "properties": {"ADMIN": "Country 0"},
+        "geometry": {"type": "Polygon", "coordinates": [[[0, 0], [1, 0], [1, 1], [0, 0]]]}
+    }]}
+    with tempfile.TemporaryDirectory() as out_dir:
+        size_full = html_size(geo_data, (js_dates, js_points, *full, js_colors, unique_users), out_dir, "full.html")
+        size_delta = html_size(geo_data, (js_dates, js_points, *delta, js_colors, unique_users), out_dir, "delta.html")
+
+    mb = lambda b: b / 1e6
+    print(f"\n{len(df)} eventi, {len(timeline_dates)} step, {len(timeline.dominance.country_names)} stati, keyframe ogni {args.keyframe_every}")
+    print(f"{'':>22} {'completo (MB)':>14} {'delta (MB)':>12} {'riduzione':>10}")
+    for label, a, b in [("dominio", len(full[0]), len(delta[0])),
+                        ("classifica", len(full[1]), len(delta[1])),
+                        ("HTML totale", size_full, size_delta)]:
+        print(f"{label:>22} {mb(a):>14.2f} {mb(b):>12.2f} {a / b:>9.1f}x")
+    print(f"{'(di cui marker)':>22} {mb(len(js_points)):>14.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import data_loader
+from synthetic_chat import write_chat
+
+def measure(fn):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    df = fn()
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(df), elapsed, peak
+
+def main():
+    parser = argparse.ArgumentParser(description="Picco di memoria (tracemalloc) di load_chat_data: completo vs streaming")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100_000, 1_000_000])
+    parser.add_argument('--poop-rate', type=float, default=0.02)
+    args = parser.parse_args()
+
+    print(f"{'messaggi':>10} {'MB file':>8} {'eventi':>8} {'picco completo':>15} {'picco streaming':>16} {'t completo':>11} {'t streaming':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.sizes:
+            path = os.path.join(tmp, f'chat_{n}.txt')
+            write_chat(path, n, poop_rate=args.poop_rate, location_rate=1.0)
+            rows, t_full, peak_full = measure(lambda: data_loader.load_chat_data(path))
+            _, t_stream, peak_stream = measure(lambda: data_loader.load_chat_data(path, streaming=True))
+            print(f"{n:>10} {os.path.getsize(path) / 1e6:>8.1f} {rows:>8} {peak_full / 1e6:>12.1f} MB "
+                  f"{peak_stream / 1e6:>13.1f} MB {t_full:>10.2f}s {t_stream:>11.2f}s")
+
+if __name__ == "__main__":
+    main()
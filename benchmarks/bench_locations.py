@@ -0,0 +1,68 @@
+import os
+import re
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import data_loader
+from synthetic_chat import DEFAULT_USERS
+
+def get_coords_apply(locations):
+    # Versione precedente: una regex Python e una Series per riga
+    def get_coords(text):
+        match = re.search(r'(-?\d+\.\d+),\s*(-?\d+\.\d+)', str(text))
+        return (float(match.group(1)), float(match.group(2))) if match else (np.nan, np.nan)
+    coords = locations.apply(get_coords).apply(pd.Series)
+    return coords[0], coords[1]
+
+def normalize_loop(users, mapping):
+    # Versione precedente: un str.replace sull'intera colonna per ogni nome da normalizzare
+    for k, v in mapping.items():
+        users = users.str.replace(k, v, regex=False)
+    return users
+
+def make_columns(n, seed=0):
+    rng = np.random.default_rng(seed)
+    lats, lons = rng.uniform(-60, 70, n), rng.uniform(-180, 180, n)
+    shapes = np.array(["Posizione: https://maps.google.com/?q={:.6f},{:.6f}", "https://www.google.com/maps/@{:.7f},{:.7f},15z",
+                       "https://maps.apple.com/?ll={:.6f},{:.6f}&q=Posizione", "Posizione: non disponibile"], dtype=object)
+    kind = rng.choice(len(shapes), n, p=[0.7, 0.15, 0.1, 0.05])
+    locations = pd.Series([shapes[k].format(lat, lon) for k, lat, lon in zip(kind, lats, lons)])
+    users = pd.Series(np.array(DEFAULT_USERS, dtype=object)[rng.integers(len(DEFAULT_USERS), size=n)])
+    return locations, users
+
+def best_of(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - t0)
+    return result, min(times)
+
+def main():
+    parser = argparse.ArgumentParser(description="Estrazione coordinate e normalizzazione utenti: versione per riga vs vettorizzata")
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000, 1_000_000], help="Eventi (cagate con posizione)")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'righe':>10} {'stadio':<18} {'prima (s)':>10} {'dopo (s)':>10} {'speedup':>8}")
+    for n in args.rows:
+        locations, users = make_columns(n)
+        (old_lat, old_lon), old_s = best_of(lambda: get_coords_apply(locations), 1 if n > 100_000 else args.repeat)
+        (new_lat, new_lon), new_s = best_of(lambda: data_loader.extract_coords(locations), args.repeat)
+        # Le forme che la versione precedente già capiva devono dare esattamente gli stessi numeri
+        assert old_lat.dropna().equals(new_lat[old_lat.notna()]) and old_lon.dropna().equals(new_lon[old_lon.notna()])
+        print(f"{n:>10} {'coordinate':<18} {old_s:>10.3f} {new_s:>10.3f} {old_s / new_s:>7.1f}x")
+
+        df = pd.DataFrame({'User': users})
+        old_users, old_s = best_of(lambda: normalize_loop(users, data_loader.USER_MAPPING), args.repeat)
+        new_users, new_s = best_of(lambda: data_loader.normalize_users(df.copy())['User'], args.repeat)
+        assert old_users.equals(new_users)
+        print(f"{n:>10} {'nomi utenti':<18} {old_s:>10.3f} {new_s:>10.3f} {old_s / new_s:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import MAP_GEOMETRY_LEVELS
+from geo_engine import GeoEngine
+from map_geometry import prepare_map_geometry
+
+def vertex_count(feature_collection):
+    def count(coords):
+        return 1 if isinstance(coords[0], (int, float)) else sum(count(c) for c in coords)
+    return sum(count(f['geometry']['coordinates']) for f in feature_collection['features'])
+
+def main():
+    parser = argparse.ArgumentParser(description="Peso del GeoJSON nella mappa: originale vs livelli semplificati")
+    parser.add_argument('--visited', type=int, default=None,
+                        help="Considera visitati solo i primi N stati del GeoJSON (default: tutti)")
+    args = parser.parse_args()
+
+    geo_engine = GeoEngine(use_cache=False)
+    names = geo_engine.countries_names[:-1].tolist()
+    visited = None if args.visited is None else names[:args.visited]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_file = os.path.join(tmp, "levels.cache")
+        t0 = time.perf_counter()
+        prepare_map_geometry(geo_engine, visited, cache_file=cache_file)
+        t_cold = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        base, levels = prepare_map_geometry(geo_engine, visited, cache_file=cache_file)
+        t_warm = time.perf_counter() - t0
+
+    full = geo_engine.geo_data
+    print(f"\n{'layer':>26} {'stati':>6} {'vertici':>10} {'MB':>8}")
+    print(f"{'originale':>26} {len(full['features']):>6} {vertex_count(full):>10} {len(json.dumps(full)) / 1e6:>8.2f}")
+    if base is not None:
+        print(f"{'base (mai visitati)':>26} {len(base['features']):>6} {vertex_count(base):>10} {len(json.dumps(base)) / 1e6:>8.2f}")
+    for (zoom, tolerance), (_, data) in zip(MAP_GEOMETRY_LEVELS, levels):
+        label = f"zoom ≥ {zoom} (toll. {tolerance}°)"
+        print(f"{label:>26} {len(data['features']):>6} {vertex_count(data):>10} {len(json.dumps(data)) / 1e6:>8.2f}")
+    print(f"\nsemplificazione: {t_cold:.2f} s a freddo, {t_warm:.2f} s dalla cache")
+
+if __name__ == "__main__":
+    main()
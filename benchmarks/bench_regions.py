@@ -0,0 +1,86 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import numpy as np
+import shapely
+from shapely import STRtree
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import GEOJSON_FILE, REGIONS_FILE
+from geo_engine import GeoEngine
+from synthetic_chat import SPREADS, sample_points
+
+def write_grid_regions(path, cells=4, geojson_file=GEOJSON_FILE):
+    # Regioni finte quando manca il file admin-1 di Natural Earth: ogni stato tagliato in una griglia cells x cells
+    with open(geojson_file) as f:
+        countries = json.load(f)['features']
+    features = []
+    for feature in countries:
+        geom = shapely.geometry.shape(feature['geometry'])
+        x0, y0, x1, y1 = geom.bounds
+        xs, ys = np.linspace(x0, x1, cells + 1), np.linspace(y0, y1, cells + 1)
+        for i in range(cells):
+            for j in range(cells):
+                part = geom.intersection(shapely.box(xs[i], ys[j], xs[i + 1], ys[j + 1]))
+                if not part.is_empty and part.area > 0:
+                    features.append({"type": "Feature", "properties": {"name": f"R{i}{j}", "admin": feature['properties']['ADMIN']},
+                                     "geometry": shapely.geometry.mapping(part)})
+    with open(path, 'w') as f:
+        json.dump({"type": "FeatureCollection", "features": features}, f)
+    return len(features)
+
+def flat_regions(geo_engine, tree, lats, lons):
+    # Senza gerarchia: un solo indice (tree) con tutte le regioni del mondo
+    point_idx, region_idx = tree.query(shapely.points(lons, lats), predicate='within')
+    found = np.full(len(lats), len(geo_engine.region_names) - 1)
+    order = np.lexsort((region_idx, point_idx))
+    point_idx, region_idx = point_idx[order], region_idx[order]
+    first = np.r_[True, point_idx[1:] != point_idx[:-1]] if len(point_idx) else np.zeros(0, dtype=bool)
+    found[point_idx[first]] = region_idx[first]
+    return geo_engine.region_names[found]
+
+def best_of(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - t0)
+    return result, min(times)
+
+def main():
+    parser = argparse.ArgumentParser(description="Regioni (admin-1): ricerca dallo stato alle sue regioni vs indice unico. "
+                                                 "Va lanciato dalla cartella che contiene il GeoJSON; senza file delle "
+                                                 "regioni ne genera uno finto a griglia")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--spread', choices=SPREADS, default='europe')
+    parser.add_argument('--cells', type=int, default=4, help="Regioni finte per lato di ogni stato")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        regions_file = REGIONS_FILE
+        if not os.path.exists(regions_file):
+            regions_file = os.path.join(tmp, 'regions.json')
+            print(f"🧩 {write_grid_regions(regions_file, args.cells)} regioni finte in {regions_file}")
+        geo_engine = GeoEngine(use_cache=False, regions_file=regions_file)
+    print(f"{len(geo_engine.region_geoms)} regioni in {len(geo_engine.region_trees)} stati\n")
+    tree = STRtree(geo_engine.region_geoms)
+
+    rng = np.random.default_rng(0)
+    print(f"{'punti':>10} {'stati (s)':>10} {'+ regioni (s)':>14} {'indice unico (s)':>17} {'speedup':>8}  identico")
+    for n in args.sizes:
+        lats, lons = sample_points(rng, n, args.spread)
+        countries, t_countries = best_of(lambda: geo_engine.get_countries(lats, lons), args.repeat)
+        regions, t_regions = best_of(lambda: geo_engine.get_regions(lats, lons, countries), args.repeat)
+        flat, t_flat = best_of(lambda: flat_regions(geo_engine, tree, lats, lons), args.repeat)
+        # Dove l'indice unico trova una regione deve essere la stessa (il resto è il ripiego sulla più vicina)
+        inside = flat != "Unknown"
+        same = bool((regions[inside] == flat[inside]).all())
+        print(f"{n:>10} {t_countries:>10.3f} {t_regions:>14.3f} {t_flat:>17.3f} {t_flat / t_regions:>7.1f}x  {same}")
+
+if __name__ == "__main__":
+    main()
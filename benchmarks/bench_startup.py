@@ -0,0 +1,86 @@
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from synthetic_chat import write_chat
+
+HEAVY = ('pandas', 'numpy', 'pyarrow', 'shapely', 'requests', 'folium')
+
+# Comandi misurati, in ordine (ogni stadio legge il file scritto dal precedente)
+SCENARIOS = [
+    ('--help', ['--help']),
+    ('render --help', ['render', '--help']),
+    ('parse', ['parse']),
+    ('geolocate', ['geolocate']),
+    ('timeline', ['timeline']),
+    ('render', ['render', '--no-open', '--renderer', 'webgl']),
+    ('all', ['all', '--no-open', '--no-store', '--renderer', 'webgl']),
+]
+# Stadi che non devono caricare la mappa (folium) né, tranne geolocate, la geometria (shapely)
+FORBIDDEN = {'--help': HEAVY, 'render --help': HEAVY, 'parse': ('shapely', 'requests', 'folium'),
+             'geolocate': ('requests', 'folium'), 'timeline': ('shapely', 'requests', 'folium')}
+
+def run(args, cwd):
+    # -X importtime scrive su stderr un riga per modulo: "import time: self | cumulato | nome" (indentato se annidato)
+    t0 = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', os.path.join(ROOT, 'main.py')] + args,
+                            cwd=cwd, capture_output=True, text=True)
+    elapsed = time.perf_counter() - t0
+    if result.returncode != 0:
+        raise RuntimeError(f"main.py {' '.join(args)} fallito:\n{result.stderr[-2000:]}")
+    # Millisecondi dei moduli di primo livello (i cumulati includono gli annidati) e nomi di tutti i moduli caricati
+    top_level, loaded = {}, set()
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            _, cumulative, name = line.split('|')
+            if cumulative.strip().isdigit():
+                loaded.add(name.strip().split('.')[0])
+                if not name[1:].startswith(' '):
+                    top_level[name.strip()] = int(cumulative) / 1000
+    return elapsed, (sum(top_level.values()), loaded)
+
+def main():
+    parser = argparse.ArgumentParser(description="Tempi di avvio di main.py per comando (python -X importtime). "
+                                                 "Va lanciato dalla cartella che contiene il GeoJSON")
+    parser.add_argument('--messages', type=int, default=10_000, help="Dimensione della chat per gli stadi")
+    parser.add_argument('--repeat', type=int, default=3, help="Esecuzioni per comando (si tiene la più veloce)")
+    parser.add_argument('--help-budget', type=float, default=300, help="Millisecondi ammessi per --help (oltre: exit 1)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        work = os.path.join(tmp, 'work')
+        os.makedirs(work)
+        for name in os.listdir('.'):
+            if name.startswith('world_hires'):
+                shutil.copy(name, work)
+        write_chat(os.path.join(work, '_chat.txt'), args.messages)
+
+        rows, failures = [], []
+        for label, command in SCENARIOS:
+            best, (imports_ms, loaded) = min((run(command, work) for _ in range(args.repeat)), key=lambda r: r[0])
+            heavy = [m for m in HEAVY if m in loaded]
+            rows.append((label, best * 1000, imports_ms, heavy))
+            bad = [m for m in FORBIDDEN.get(label, ()) if m in loaded]
+            if bad:
+                failures.append(f"{label} importa {', '.join(bad)}")
+            if label == '--help' and best * 1000 > args.help_budget:
+                failures.append(f"--help in {best * 1000:.0f} ms (budget {args.help_budget:.0f} ms)")
+
+    print(f"\n{'comando':<16} {'totale (ms)':>12} {'import (ms)':>12}  librerie pesanti caricate")
+    for label, total, imports_ms, heavy in rows:
+        print(f"{label:<16} {total:>12.0f} {imports_ms:>12.0f}  {', '.join(heavy) or '-'}")
+    for failure in failures:
+        print(f"🐌 {failure}")
+    if failures:
+        sys.exit(1)
+    print("✅ Avvio nei limiti")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import data_loader
+from event_store import event_coords
+from geo_engine import GeoEngine
+from timeline import build_timeline
+from synthetic_chat import write_chat, SPREADS
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+def measure(fn, memory=True):
+    # Tempo su un'esecuzione pulita; il picco di memoria (tracemalloc) su una seconda, perché il tracing rallenta
+    t0 = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - t0
+    peak = None
+    if memory:
+        tracemalloc.start()
+        fn()
+        peak = tracemalloc.get_traced_memory()[1] / 1e6
+        tracemalloc.stop()
+    return result, {'time_s': round(elapsed, 4), 'peak_mb': round(peak, 2) if peak is not None else None}
+
+def run_size(geo_engine, n_messages, args, tmp):
+    path = os.path.join(tmp, f"chat_{n_messages}.txt")
+    write_chat(path, n_messages, args.users, args.poop_rate, args.location_rate, args.spread, args.seed)
+    results = {}
+
+    df, results['load_chat_data'] = measure(lambda: data_loader.load_chat_data(path, streaming=True, workers=1), args.memory)
+    results['load_chat_data']['rows'] = len(df)
+
+    lats, lons = event_coords(df)
+    countries, results['get_countries'] = measure(lambda: geo_engine.get_countries(lats, lons), args.memory)
+    results['get_countries']['rows'] = len(df)
+    df['Country'] = countries
+
+    # Punto per punto solo su un campione fisso: serve a vedere regressioni del percorso lento, non a misurarlo tutto
+    sample = min(len(df), args.loop_sample)
+    _, results['get_country'] = measure(lambda: [geo_engine.get_country(lat, lon) for lat, lon in zip(lats[:sample], lons[:sample])], False)
+    results['get_country']['rows'] = sample
+
+    users = sorted(df['User'].unique())
+    timeline, results['timeline'] = measure(lambda: build_timeline(df, users), args.memory)
+    results['timeline']['rows'] = len(df)
+
+    _, results['json'] = measure(lambda: [json.dumps(part) for part in timeline.payload() + timeline.awards_payload()], args.memory)
+    results['json']['rows'] = len(timeline.timeline_dates)
+    return results
+
+def compare(current, baseline, tolerance, min_delta):
+    # Regressione: più lento della baseline oltre la tolleranza (e di almeno min_delta secondi, sotto è rumore)
+    regressions = []
+    print(f"\n{'messaggi':>10} {'stadio':<16} {'righe':>9} {'tempo (s)':>10} {'baseline':>10} {'rapporto':>9} {'picco MB':>9}")
+    for size, stages in current.items():
+        for name, m in stages.items():
+            base = baseline.get(size, {}).get(name)
+            ratio = m['time_s'] / base['time_s'] if base and base['time_s'] > 0 else None
+            slow = ratio is not None and ratio > 1 + tolerance and m['time_s'] - base['time_s'] > min_delta
+            if slow:
+                regressions.append((size, name, ratio))
+            peak = f"{m['peak_mb']:.1f}" if m['peak_mb'] is not None else '-'
+            print(f"{size:>10} {name:<16} {m['rows']:>9} {m['time_s']:>10.3f} "
+                  f"{base['time_s'] if base else '-':>10} {f'{ratio:.2f}x' if ratio else '-':>9} {peak:>9}{'  ⚠️' if slow else ''}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Suite di benchmark della pipeline su chat sintetiche, con confronto su una baseline. "
+                                                 "Va lanciata dalla cartella che contiene il GeoJSON (come main.py)")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000, 1_000_000], help="Messaggi per chat")
+    parser.add_argument('--users', type=int, default=6)
+    parser.add_argument('--poop-rate', type=float, default=0.1)
+    parser.add_argument('--location-rate', type=float, default=0.8)
+    parser.add_argument('--spread', choices=SPREADS, default='europe')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--loop-sample', type=int, default=2_000, help="Punti per la misura di get_country punto per punto")
+    parser.add_argument('--no-memory', dest='memory', action='store_false', help="Salta la seconda esecuzione con tracemalloc")
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--save-baseline', action='store_true', help="Salva i risultati come nuova baseline")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Rallentamento ammesso rispetto alla baseline (0.25 = +25%%)")
+    parser.add_argument('--min-delta', type=float, default=0.05, help="Differenza minima in secondi per segnalare una regressione")
+    parser.add_argument('--output', default=None, help="Salva anche i risultati di questa esecuzione in un file JSON")
+    args = parser.parse_args()
+
+
+    # L'avvio del motore geografico non dipende dalla chat: misurato una volta (senza cache dei punti)
+    geo_engine, startup = measure(lambda: GeoEngine(use_cache=False), args.memory)
+    current = {'startup': {'geo_startup': dict(startup, rows=len(geo_engine.countries_polys))}}
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.sizes:
+            print(f"⏱️ {n} messaggi...")
+            current[str(n)] = run_size(geo_engine, n, args, tmp)
+
+    result = {
+        'machine': {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count()},
+        'params': {k: getattr(args, k) for k in ['users', 'poop_rate', 'location_rate', 'spread', 'seed', 'loop_sample']},
+        'results': current,
+    }
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline['params'] != result['params']:
+            print("⚠️ Baseline registrata con parametri diversi: il confronto è solo indicativo")
+
+    regressions = compare(current, baseline['results'] if baseline else {}, args.tolerance, args.min_delta)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f"💾 Baseline salvata in {args.baseline}")
+    elif baseline is None:
+        print(f"ℹ️ Nessuna baseline in {args.baseline}: salvarne una con --save-baseline")
+    elif regressions:
+        for size, name, ratio in regressions:
+            print(f"🐌 Regressione: {name} a {size} messaggi è {ratio:.2f}x la baseline")
+        sys.exit(1)
+    else:
+        print("✅ Nessuna regressione rispetto alla baseline")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import PASTEL_HEX_MAP, USER_CONFIG, sanitize_class_name
+from timeline import build_timeline
+from synthetic_chat import make_events
+
+def legacy_timeline(df, unique_users):
+    # Copia del vecchio loop di main.py (O(minuti × righe)), tenuta come riferimento
+    df = df.sort_values(by='Timestamp')
+    timeline_dates = df['Timestamp'].dt.strftime('%Y-%m-%d %H:%M').unique().tolist()
+
+    data_by_time = {}
+    dominance_by_time = {}
+    user_totals_by_time = {}
+    geo_dominance_accum = {}
+    user_counts_accum = {u: 0 for u in unique_users}
+
+    for time_val in timeline_dates:
+        current_slice = df[df['Timestamp'].dt.strftime('%Y-%m-%d %H:%M') == time_val]
+
+        for _, row in current_slice.iterrows():
+            u = row['User']
+            c = row['Country']
+            user_counts_accum[u] += 1
+
+            if c != "Unknown":
+                if c not in geo_dominance_accum: geo_dominance_accum[c] = {}
+                geo_dominance_accum[c][u] = geo_dominance_accum[c].get(u, 0) + 1
+
+        current_map_colors = {}
+        for country, contenders in geo_dominance_accum.items():
+            winner = max(contenders, key=contenders.get)
+            winner_color = PASTEL_HEX_MAP.get(USER_CONFIG.get(winner, {}).get('color'), '#333')
+            current_map_colors[country] = winner_color
+
+        dominance_by_time[time_val] = current_map_colors
+        user_totals_by_time[time_val] = user_counts_accum.copy()
+
+        features_slice = []
+        for _, row in current_slice.iterrows():
+            user = row['User']
+            color = PASTEL_HEX_MAP.get(USER_CONFIG.get(user, {}).get('color', 'gray'), 'gray')
+            popup = f"<b>{user}</b><br>{row['Country']}<br>{row['Timestamp'].strftime('%H:%M')}"
+            features_slice.append({
+                "lat": row['Latitude'], "lon": row['Longitude'],
+                "user": user, "hex_color": color,
+                "safe_class": sanitize_class_name(user),
+                "popup": popup
+            })
+        data_by_time[time_val] = features_slice
+
+    return timeline_dates, data_by_time, dominance_by_time, user_totals_by_time
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - t0
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del motore timeline")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--legacy-max', type=int, default=10_000,
+                        help="Dimensione massima su cui eseguire anche il loop legacy (quadratico)")
+    args = parser.parse_args()
+
+    print(f"{'eventi':>10} {'legacy (s)':>12} {'nuovo (s)':>12} {'speedup':>10}  json identico")
+    for n in args.sizes:
+        # Un evento ogni ~20 minuti in media: storia pluriennale con molti minuti distinti
+        df = make_events(n, n_countries=7, max_gap=2400, spread='italy')
+        unique_users = sorted(df['User'].unique())
+        new, t_new = timed(lambda: build_timeline(df, unique_users).result())
+
+        if n <= args.legacy_max:
+            old, t_old = timed(legacy_timeline, df, unique_users)
+            same = all(json.dumps(a) == json.dumps(b) for a, b in zip(old, new))
+            print(f"{n:>10} {t_old:>12.2f} {t_new:>12.2f} {t_old / t_new:>9.0f}x  {same}")
+        else:
+            print(f"{n:>10} {'-':>12} {t_new:>12.2f} {'-':>10}  -")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from geo_engine import GeoEngine
+from live import LiveState, LiveServer
+from synthetic_chat import write_chat
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def last_timestamp(path):
+    with open(path, 'rb') as f:
+        f.seek(-4096, os.SEEK_END)
+        last = f.read().decode('utf-8', errors='ignore').rstrip('\n').rsplit('\n', 1)[-1]
+    return pd.to_datetime(last[1:19], format='%d/%m/%y, %H:%M:%S')
+
+async def read_event(reader):
+    # Un evento SSE: righe "event:"/"data:" fino alla riga vuota (i commenti ": ping" si saltano)
+    event, data = None, None
+    while True:
+        line = (await reader.readline()).decode().rstrip('\n')
+        if line.startswith('event: '):
+            event = line[7:]
+        elif line.startswith('data: '):
+            data = json.loads(line[6:])
+        elif not line and event:
+            return event, data
+
+async def measure(chat_file, port, appends, interval, rng):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(b"GET /events HTTP/1.1\r\nHost: localhost\r\n\r\n")
+    await reader.readuntil(b'\r\n\r\n')
+
+    when = last_timestamp(chat_file)
+    latencies = []
+    for _ in range(appends):
+        await asyncio.sleep(interval)
+        # Un minuto dopo l'ultimo messaggio: ogni 💩 è uno step nuovo
+        when += pd.Timedelta(minutes=1)
+        stamp = when.strftime('[%d/%m/%y, %H:%M:%S]')
+        lat, lon = rng.uniform(36.0, 47.0), rng.uniform(6.0, 19.0)
+        t0 = time.perf_counter()
+        with open(chat_file, 'a', encoding='utf-8') as f:
+            f.write(f"{stamp} cosimobicci: 💩\n{stamp} cosimobicci: Posizione: https://maps.google.com/?q={lat:.6f},{lon:.6f}\n")
+        event, update = await read_event(reader)
+        latencies.append(time.perf_counter() - t0)
+        if event != 'steps' or update['dates'][-1] != when.strftime('%Y-%m-%d %H:%M') or len(update['points']) != 1:
+            raise RuntimeError(f"Aggiornamento inatteso: {event}")
+    writer.close()
+    return np.array(latencies)
+
+async def run(args, chat_file, geo_engine):
+    state = LiveState(chat_file, geo_engine)
+    state.poll()
+    port = free_port()
+    server = LiveServer(state, os.path.join(os.path.dirname(chat_file), "live.html"), poll_interval=args.poll_interval)
+    task = asyncio.create_task(server.serve('127.0.0.1', port))
+    while server.page is None:
+        await asyncio.sleep(0.05)
+    await asyncio.sleep(0.2)
+    try:
+        return await measure(chat_file, port, args.appends, args.interval, np.random.default_rng(0))
+    finally:
+        task.cancel()
+
+def main():
+    parser = argparse.ArgumentParser(description="Latenza della modalità live: riga aggiunta alla chat -> evento SSE ricevuto. "
+                                                 "Va lanciato dalla cartella che contiene il GeoJSON")
+    parser.add_argument('--messages', type=int, nargs='+', default=[10_000, 100_000, 1_000_000],
+                        help="Dimensione della chat già presente quando parte il server")
+    parser.add_argument('--appends', type=int, default=20)
+    parser.add_argument('--interval', type=float, default=0.5, help="Secondi tra un'aggiunta e l'altra")
+    parser.add_argument('--poll-interval', type=float, default=0.2)
+    args = parser.parse_args()
+
+    geo_engine = GeoEngine(use_cache=False)
+    print(f"{'messaggi':>10} {'eventi':>8} {'mediana (ms)':>13} {'p95 (ms)':>9} {'max (ms)':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.messages:
+            chat_file = os.path.join(tmp, f"chat_{n}.txt")
+            events = write_chat(chat_file, n)
+            latencies = asyncio.run(run(args, chat_file, geo_engine)) * 1000
+            print(f"{n:>10} {events:>8} {np.median(latencies):>13.0f} {np.percentile(latencies, 95):>9.0f} {latencies.max():>9.0f}")
+
+if __name__ == "__main__":
+    main()
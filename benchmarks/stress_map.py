@@ -0,0 +1,44 @@
+import os
+import sys
+import json
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import PASTEL_HEX_MAP, USER_CONFIG
+from timeline import TimelineBuilder
+from map_builder import create_map, RENDERERS
+from synthetic_chat import make_events
+
+def main():
+    parser = argparse.ArgumentParser(description="Pagine di stress dei marker con contatore FPS")
+    parser.add_argument('--points', type=int, default=100_000)
+    parser.add_argument('--renderers', nargs='+', choices=RENDERERS, default=list(RENDERERS))
+    parser.add_argument('--out-dir', default='.')
+    parser.add_argument('--open', action='store_true', help="Apre le pagine nel browser")
+    args = parser.parse_args()
+
+    df = make_events(args.points, max_gap=7200, skew=1.2)
+    unique_users = sorted(df['User'].unique())
+    timeline_dates, data_by_time, dominance_payload, totals_payload = TimelineBuilder(unique_users).add(df).payload()
+    js_data = (
+        json.dumps(timeline_dates),
+        json.dumps(data_by_time),
+        json.dumps(dominance_payload),
+        json.dumps(totals_payload),
+        json.dumps({u: PASTEL_HEX_MAP.get(USER_CONFIG.get(u, {}).get('color'), 'gray') for u in unique_users}),
+        unique_users
+    )
+    # Geometria fittizia: la pagina misura solo il costo dei marker
+    geo_data = {"type": "FeatureCollection", "features": [{
+        "type": "Feature", "properties": {"ADMIN": "Country 0"},
+        "geometry": {"type": "Polygon", "coordinates": [[[0, 0], [1, 0], [1, 1], [0, 0]]]}
+    }]}
+
+    for renderer in args.renderers:
+        output_file = os.path.join(args.out_dir, f"stress_{renderer}_{args.points}.html")
+        create_map(geo_data, js_data, output_file, open_browser=args.open, renderer=renderer, show_fps=True)
+    print("👉 Aprire le pagine e premere '▶ Pan 5s a fine timeline': tutti i punti visibili, FPS medio durante il pan")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import os
+import argparse
+import numpy as np
+import pandas as pd
+
+# Nomi come compaiono nell'export (quelli di USER_MAPPING vengono poi normalizzati da data_loader)
+DEFAULT_USERS = ['cosimobicci', 'riki nata', 'Leo Chelsea', 'mariam', 'Asia Mariani', 'Stefano Panichi',
+                 'Luca Viezzoli', 'Francesca Piersigilli', 'Maurizio dalla sezione Marketing',
+                 'Federation non è rotto qualcosa Yonghong']
+
+# Distribuzione geografica dei punti: gruppi gaussiani (lat, lon, deviazione in gradi); 'world' = uniforme
+SPREADS = {
+    'city': [(45.4642, 9.1900, 0.05)],
+    'italy': [(45.4, 9.2, 0.6), (41.9, 12.5, 0.6), (40.8, 14.3, 0.5), (43.8, 11.2, 0.8)],
+    'europe': [(48.0, 10.0, 7.0), (41.9, 12.5, 2.0)],
+    'world': None,
+}
+
+# Nomi già normalizzati (quelli di USER_CONFIG), per gli eventi generati senza passare dalla chat
+EVENT_USERS = ['Cosimo', 'Riccardo', 'Mariam', 'Tommaso', 'Armando', 'Stefano', 'Leo', 'Francesca', 'Luca', 'Asia']
+
+TEXTS = ['ciao come va', 'ahahah', 'chi viene stasera?', 'raga ci sentiamo dopo', 'ok',
+         'messaggio di testo qualunque, giusto per fare volume nella chat', 'Posizione: tra poco arrivo']
+
+def sample_points(rng, n, spread):
+    if SPREADS[spread] is None:
+        return rng.uniform(-60.0, 75.0, n), rng.uniform(-180.0, 180.0, n)
+    clusters = np.array(SPREADS[spread])
+    pick = rng.integers(len(clusters), size=n)
+    lats = np.clip(rng.normal(clusters[pick, 0], clusters[pick, 2]), -89.0, 89.0)
+    lons = (rng.normal(clusters[pick, 1], clusters[pick, 2]) + 180.0) % 360.0 - 180.0
+    return lats, lons
+
+def write_chat(path, n_messages, n_users=6, poop_rate=0.1, location_rate=0.8, spread='europe', seed=0,
+               start='2021-01-01', multiline_rate=0.02):
+    # Export nel formato "[dd/mm/yy, HH:MM:SS] Utente: messaggio". Ogni 💩 è seguita, con probabilità location_rate,
+    # dalla posizione dello stesso utente (l'unico caso che data_loader trasforma in evento).
+    # Ritorna il numero di eventi attesi
+    rng = np.random.default_rng(seed)
+    users = (DEFAULT_USERS + [f"Utente {k}" for k in range(len(DEFAULT_USERS), n_users)])[:n_users]
+    # Attività sbilanciata come in una chat vera: il primo utente scrive molto più dell'ultimo
+    weights = 1.0 / np.arange(1, n_users + 1)
+
+    # "Turni": un messaggio, oppure 💩 + posizione (due messaggi)
+    is_poop = rng.random(n_messages) < poop_rate
+    has_location = is_poop & (rng.random(n_messages) < location_rate)
+    n_turns = int(np.searchsorted(np.cumsum(1 + has_location), n_messages)) + 1
+    is_poop, has_location = is_poop[:n_turns], has_location[:n_turns]
+    turn_users = rng.choice(n_users, size=n_turns, p=weights / weights.sum())
+
+    # Messaggi in ordine: il turno k occupa 1 o 2 righe, la posizione arriva entro 30 secondi
+    kind = np.repeat(np.where(is_poop, 1, 0), 1 + has_location)
+    second = np.r_[False, np.diff(np.repeat(np.arange(n_turns), 1 + has_location)) == 0]
+    kind[second] = 2
+    kind, second = kind[:n_messages], second[:n_messages]
+    user = np.repeat(turn_users, 1 + has_location)[:n_messages]
+    gaps = np.where(second, rng.integers(0, 31, len(kind)), rng.integers(1, 600, len(kind)))
+    stamps = (pd.Timestamp(start) + pd.to_timedelta(np.cumsum(gaps), unit='s')).strftime('[%d/%m/%y, %H:%M:%S]')
+
+    lats, lons = sample_points(rng, int((kind == 2).sum()), spread)
+    texts = rng.integers(len(TEXTS), size=len(kind))
+    continued = rng.random(len(kind)) < multiline_rate
+
+    body = []
+    points = iter(zip(lats.tolist(), lons.tolist()))
+    for stamp, k, u, t, cont in zip(stamps, kind.tolist(), user.tolist(), texts.tolist(), continued.tolist()):
+        if k == 1:
+            text = '💩'
+        elif k == 2:
+            lat, lon = next(points)
+            text = f"Posizione: https://maps.google.com/?q={lat:.6f},{lon:.6f}"
+        else:
+            # Testo, a volte su più righe (le righe senza "[" data_loader le salta)
+            text = TEXTS[t] + ("\nseconda riga del messaggio" if cont else "")
+        body.append(f"{stamp} {users[u]}: {text}\n")
+
+    with open(path, 'w', encoding='utf-8') as f:
+        f.writelines(body)
+    return int((kind == 2).sum())
+
+def make_events(n, n_users=10, n_countries=150, max_gap=600, unknown_rate=0.05, missing_time_rate=0.0, skew=1.3,
+                spread='world', start='2020-01-01', seed=0):
+    # Eventi già geolocalizzati (come dopo assign_countries) senza parsing né GeoEngine: un evento ogni
+    # 1..max_gap secondi, utenti sbilanciati come in write_chat, stati "Country k" con frequenza zipf(skew),
+    # una quota di "Unknown" e di righe senza orario. Coordinate da sample_points, a 6 decimali come nei link
+    rng = np.random.default_rng(seed)
+    users = np.array((EVENT_USERS + [f"Utente {k}" for k in range(len(EVENT_USERS), n_users)])[:n_users], dtype=object)
+    weights = 1.0 / np.arange(1, n_users + 1)
+    countries = np.array([f"Country {c}" for c in range(n_countries)], dtype=object)[rng.zipf(skew, n) % n_countries]
+    countries[rng.random(n) < unknown_rate] = "Unknown"
+    lats, lons = sample_points(rng, n, spread)
+    df = pd.DataFrame({
+        'Timestamp': pd.Timestamp(start) + pd.to_timedelta(np.cumsum(rng.integers(1, max_gap + 1, n)), unit='s'),
+        'User': users[rng.choice(n_users, size=n, p=weights / weights.sum())],
+        'Country': countries,
+        'Latitude': lats.round(6),
+        'Longitude': lons.round(6),
+    })
+    df.loc[rng.random(n) < missing_time_rate, 'Timestamp'] = pd.NaT
+    return df
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera un export WhatsApp sintetico nel formato letto da data_loader")
+    parser.add_argument('output', help="File di destinazione (es. _chat.txt)")
+    parser.add_argument('--messages', type=int, default=100_000)
+    parser.add_argument('--users', type=int, default=6)
+    parser.add_argument('--poop-rate', type=float, default=0.1, help="Quota di messaggi che sono una 💩")
+    parser.add_argument('--location-rate', type=float, default=0.8, help="Quota di 💩 seguite dalla posizione")
+    parser.add_argument('--spread', choices=SPREADS, default='europe', help="Distribuzione geografica dei punti")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    events = write_chat(args.output, args.messages, args.users, args.poop_rate, args.location_rate, args.spread, args.seed)
+    print(f"💬 {args.messages} messaggi ({events} eventi con posizione) in {args.output} "
+          f"({os.path.getsize(args.output) / 1e6:.1f} MB)")
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,18 @@ import re
 
 # URL GeoJSON Alta Risoluzione
 GEOJSON_URL = "https://raw.githubusercontent.com/nvkelso/natural-earth-vector/master/geojson/ne_10m_admin_0_countries.geojson"
+GEOJSON_FILE = "world_hires.json"
+# Cache binaria dei poligoni (WKB + nomi), validata con hash e mtime di GEOJSON_FILE
+GEOMETRY_CACHE_FILE = "world_hires.cache"
+# Geometrie semplificate per la mappa: (zoom minimo, tolleranza in gradi), dalla più grossolana alla più fine.
+# Allo zoom 4 un pixel è ~0.09°, quindi 0.1° equivale a Natural Earth 110m
+MAP_GEOMETRY_LEVELS = ((0, 0.1), (5, 0.02), (7, 0.004))
+MAP_GEOMETRY_CACHE_FILE = "world_hires.levels.cache"
+# Regioni (admin-1) di Natural Earth, da scaricare a mano: ne_10m_admin_1_states_provinces.geojson
+# (stesso repository di GEOJSON_URL). Se il file non c'è, dominio solo per stato
+REGIONS_FILE = "regions_hires.json"
+REGIONS_CACHE_FILE = "regions_hires.cache"
+REGIONS_LEVELS_CACHE_FILE = "regions_hires.levels.cache"
 
 PASTEL_HEX_MAP = {
     'beige':     '#FFF0B5', 'magenta':   '#FF66FF', 'purple':    '#DA70D6',
@@ -30,5 +42,56 @@ AWARDS_CONFIG = {
     'west': ('Re del West', '🤠', 300), 'base_poop': ('Attività Base', '💩', 20)
 }
 
+# Processi per il parsing della chat (1 = seriale, None = tutti i core). Il parallelo è facoltativo:
+# avviare il pool costa più del parsing di una chat piccola, conviene solo per export molto grandi
+PARSE_WORKERS = 1
+
+# Store colonnare degli eventi geolocalizzati (.arrow = Arrow IPC con memory map, .parquet = Parquet)
+EVENT_STORE_FILE = "events.arrow"
+# Coordinate degli eventi in punto fisso (int32): unità = 1/COORD_SCALE di grado (1e7 ≈ 1 cm, ±214° entrano in int32)
+COORD_SCALE = 10_000_000
+
+# Stato della modalità incrementale (eventi geolocalizzati, checkpoint e accumulatori della timeline)
+INGEST_STATE_FILE = "ingest_state.pkl"
+
+# Cache persistente punto → stato (coordinate quantizzate a GEO_CACHE_PRECISION decimali, 4 ≈ 11 m).
+# Facoltativa: tutti i punti di una cella prendono lo stato del primo punto visto, quindi a meno di mezza
+# cella da un confine il risultato può differire dalla ricerca esatta
+GEO_CACHE_ENABLED = False
+GEO_CACHE_FILE = "country_cache.sqlite"
+GEO_CACHE_PRECISION = 4
+GEO_CACHE_SIZE = 100_000
+
+# Disegno dei marker nella mappa: 'svg' (un elemento per punto), 'canvas' (Leaflet su canvas) o 'webgl' (un solo layer)
+MAP_RENDERER = "svg"
+MAP_RENDERERS = ('svg', 'canvas', 'webgl')
+
+# Granularità della timeline all'apertura della mappa e quelle selezionabili nella pagina
+# ('minute', 'hour', 'day', 'week', 'month' oppure un intero = N eventi per step)
+TIMELINE_GRANULARITY = "minute"
+MAP_GRANULARITIES = ("minute", "hour", "day", "week", "month")
+
+# CLI a stadi (main.py parse | geolocate | timeline | render): file di default in ingresso/uscita di ogni stadio.
+# parse scrive gli eventi senza stato, geolocate lo store completo (lo stesso che riusa main.py all)
+CHAT_FILE = "_chat.txt"
+PARSED_EVENTS_FILE = "events_parsed.arrow"
+TIMELINE_FILE = "timeline.json"
+MAP_OUTPUT_FILE = "Mappa_Dominio_Finale.html"
+
+# Modalità split della mappa: punti per file dati (i blocchi arrivano al browser uno dopo l'altro)
+DATA_CHUNK_POINTS = 50_000
+
+# Modalità live: server locale (SSE) e ogni quanti secondi si controlla se la chat è cresciuta
+LIVE_HOST = "127.0.0.1"
+LIVE_PORT = 8765
+LIVE_OUTPUT_FILE = "Mappa_Live.html"
+LIVE_POLL_INTERVAL = 0.2
+# Messaggi in attesa per pagina: oltre, la pagina è ferma e al posto degli step riceve un reset
+LIVE_CLIENT_QUEUE = 64
+
+# Modalità batch (batch.py): processi per le chat di una cartella (None = tutti i core) e cartella delle mappe
+BATCH_WORKERS = None
+BATCH_OUTPUT_DIR = "mappe"
+
 def sanitize_class_name(name):
     return re.sub(r'[^a-zA-Z0-9]', '_', name)
@@ -0,0 +1,108 @@
+import os
+import gzip
+import json
+import numpy as np
+import pandas as pd
+from config import PASTEL_HEX_MAP, USER_CONFIG, DATA_CHUNK_POINTS, sanitize_class_name
+from event_store import event_coords
+from timeline import TIME_FORMAT, KEYFRAME_EVERY, encode_deltas
+
+DATA_DIR = "data"
+# Minuto dello step senza orario nei file dei punti (nessuna chat ha messaggi del 31/12/1969 23:59)
+MISSING_MINUTE = -1
+
+def _write_gz(path, payload):
+    # Precompressi una volta sola (mtime=0: stesso input, stessi byte); il browser li decomprime da sé
+    with open(path, 'wb') as f:
+        f.write(gzip.compress(payload, compresslevel=9, mtime=0))
+    return os.path.getsize(path)
+
+def _chunk_bounds(step_ends, keyframe_every, chunk_points):
+    # Blocchi di step allineati ai keyframe, ciascuno con almeno chunk_points punti (tranne l'ultimo)
+    n_steps = len(step_ends)
+    bounds = [0]
+    for s in range(keyframe_every, n_steps, keyframe_every):
+        start_points = step_ends[bounds[-1] - 1] if bounds[-1] else 0
+        if step_ends[s - 1] - start_points >= chunk_points:
+            bounds.append(s)
+    if n_steps:
+        bounds.append(n_steps)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+def write_data_files(df, timeline, output_dir, base_geo=None, geo_levels=None, region_levels=None,
+                     chunk_points=DATA_CHUNK_POINTS, keyframe_every=KEYFRAME_EVERY):
+    # File accanto all'HTML: punti in binario (typed array) e dominio/classifica in JSON, tutto gzip.
+    # Ritorna il manifest (piccolo) che l'HTML incorpora per sapere cosa scaricare e in che ordine
+    data_dir = os.path.join(output_dir, DATA_DIR)
+    os.makedirs(data_dir, exist_ok=True)
+
+    # Stesso ordine dei punti della timeline: righe con orario, ordinate in modo stabile
+    events = df[df['Timestamp'].notna()].sort_values(by='Timestamp', kind='stable')
+    step_ends = timeline.step_ends().astype(np.uint32)
+    if len(events) != (int(step_ends[-1]) if len(step_ends) else 0):
+        raise ValueError("Eventi e timeline non corrispondono: ricalcolare la timeline sugli stessi eventi")
+
+    users = list(timeline.unique_users)
+    user_codes = pd.Categorical(events['User'], categories=users).codes.astype(np.uint16)
+    country_codes, countries = pd.factorize(events['Country'])
+    country_codes = country_codes.astype(np.uint16)
+    lats, lons = (coords.astype(np.float32) for coords in event_coords(events))
+    # Lo step "senza orario" (NaN in coda) diventa MISSING_MINUTE: il loader JS lo mostra come NaN, come la pagina unica
+    step_times = pd.to_datetime(pd.Series(timeline.timeline_dates, dtype=object), format=TIME_FORMAT)
+    step_minutes = np.where(step_times.notna(), step_times.fillna(pd.Timestamp(0)).astype('datetime64[s]')
+                            .astype(np.int64).to_numpy() // 60, MISSING_MINUTE).astype(np.int32)
+
+    dominance = encode_deltas(timeline.dominance_changes, keyframe_every=keyframe_every)
+    totals = encode_deltas(timeline.user_totals_changes, {u: 0 for u in users}, keyframe_every)
+    xp, awards = timeline.awards_payload(keyframe_every)
+    # Dominio per regione solo se c'è anche la geometria delle regioni da mostrare
+    regions = timeline.region_payload(keyframe_every) if region_levels else None
+
+    chunks = []
+    total_bytes = 0
+    for k, (s0, s1) in enumerate(_chunk_bounds(step_ends, keyframe_every, chunk_points)):
+        p0 = int(step_ends[s0 - 1]) if s0 else 0
+        p1 = int(step_ends[s1 - 1])
+        # Layout: minuti degli step (int32), fine cumulata (uint32), lat, lon (float32), utente, stato (uint16)
+        points = b''.join([step_minutes[s0:s1].tobytes(), step_ends[s0:s1].tobytes(),
+                           lats[p0:p1].tobytes(), lons[p0:p1].tobytes(),
+                           user_codes[p0:p1].tobytes(), country_codes[p0:p1].tobytes()])
+        k0, k1 = s0 // keyframe_every, -(-s1 // keyframe_every)
+        steps = {'dominance': {'keyframes': dominance['keyframes'][k0:k1], 'deltas': dominance['deltas'][s0:s1]},
+                 'totals': {'keyframes': totals['keyframes'][k0:k1], 'deltas': totals['deltas'][s0:s1]},
+                 'xp': {'keyframes': xp['keyframes'][k0:k1], 'deltas': xp['deltas'][s0:s1]},
+                 'awards': {'keyframes': awards['keyframes'][k0:k1], 'deltas': awards['deltas'][s0:s1]}}
+        if regions is not None:
+            steps['regions'] = {'keyframes': regions['keyframes'][k0:k1], 'deltas': regions['deltas'][s0:s1]}
+        chunk = {'points': f"points_{k}.bin.gz", 'steps_file': f"steps_{k}.json.gz", 'steps': [s0, s1], 'range': [p0, p1]}
+        total_bytes += _write_gz(os.path.join(data_dir, chunk['points']), points)
+        total_bytes += _write_gz(os.path.join(data_dir, chunk['steps_file']), json.dumps(steps).encode())
+        chunks.append(chunk)
+
+    geometry = {'base': None, 'levels': []}
+    if base_geo is not None and base_geo['features']:
+        geometry['base'] = "geometry_base.json.gz"
+        total_bytes += _write_gz(os.path.join(data_dir, geometry['base']), json.dumps(base_geo).encode())
+    for i, (zoom, data) in enumerate(geo_levels or []):
+        file_name = f"geometry_{i}.json.gz"
+        total_bytes += _write_gz(os.path.join(data_dir, file_name), json.dumps(data).encode())
+        geometry['levels'].append({'min_zoom': zoom, 'file': file_name})
+    if regions is not None:
+        geometry['region_levels'] = []
+        for i, (zoom, data) in enumerate(region_levels):
+            file_name = f"regions_{i}.json.gz"
+            total_bytes += _write_gz(os.path.join(data_dir, file_name), json.dumps(data).encode())
+            geometry['region_levels'].append({'min_zoom': zoom, 'file': file_name})
+
+    print(f"📦 {len(chunks)} blocchi dati + {len(geometry['levels'])} livelli geometria in {data_dir} ({total_bytes / 1e6:.1f} MB compressi)")
+    return {
+        'data_dir': DATA_DIR + "/",
+        'keyframe_every': keyframe_every,
+        'n_steps': len(step_ends),
+        'n_points': int(step_ends[-1]) if len(step_ends) else 0,
+        'users': [{'name': u, 'safe_class': sanitize_class_name(u),
+                   'hex_color': PASTEL_HEX_MAP.get(USER_CONFIG.get(u, {}).get('color', 'gray'), 'gray')} for u in users],
+        'countries': countries.tolist(),
+        'chunks': chunks,
+        'geometry': geometry,
+    }
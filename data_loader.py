@@ -0,0 +1,267 @@
+import pandas as pd
+import re
+import os
+import io
+import hashlib
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from profiling import stage
+from event_store import compact_events, concat_events
+
+MESSAGE_PATTERN = r"^\[(\d{2}\/\d{2}\/\d{2}),\s(\d{2}:\d{2}:\d{2})\]\s([^:]+):\s(.*)$"
+MESSAGE_RE = re.compile(MESSAGE_PATTERN)
+LOCATION_RE = re.compile(r'Posizione:|maps')
+COORDS_RE = re.compile(r'(-?\d+\.\d+),\s*(-?\d+\.\d+)')
+# Link di Google/Apple Maps che COORDS_RE non riconosce: coordinate dopo q=, ll=, query= (e simili) o "@",
+# con la virgola codificata (%2C) o senza decimali. Si prova solo se COORDS_RE non trova nulla
+URL_COORDS_RE = re.compile(r'(?:[?&](?:q|ll|sll|query|daddr|destination)=|@)(-?\d+(?:\.\d+)?)(?:,|%2[Cc])\s*(-?\d+(?:\.\d+)?)')
+
+# Mapping Utenti (Normalizzazione nomi)
+USER_MAPPING = {
+    'cosimobicci': 'Cosimo', 'riki nata': 'Riccardo', 'Federation non è rotto qualcosa Yonghong': 'Armando',
+    'Maurizio dalla sezione Marketing': 'Tommaso', 'Asia Mariani': 'Asia', 'Stefano Panichi': 'Stefano',
+    'Leo Chelsea': 'Leo', 'Luca Viezzoli': 'Luca', 'mariam': 'Mariam', 'Francesca Piersigilli': 'Francesca'
+}
+
+STREAM_CHUNK_SIZE = 50_000
+
+def load_chat_data(file_name='_chat.txt', streaming=False, chunk_size=STREAM_CHUNK_SIZE, workers=1):
+    if not os.path.exists(file_name):
+        raise FileNotFoundError(f"⚠️ ERRORE: '{file_name}' mancante!")
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers > 1:
+        return load_chat_data_parallel(file_name, workers, chunk_size)
+    if streaming:
+        return load_chat_data_streaming(file_name, chunk_size)
+
+    print("📂 Lettura chat...")
+    with stage('read'):
+        with open(file_name, 'r', encoding='utf-8') as f:
+            chat_content = f.read()
+
+    with stage('regex') as s:
+        matches = re.findall(MESSAGE_PATTERN, chat_content, re.MULTILINE)
+        data = [{'Date_Str': m[0], 'Time_Str': m[1], 'User': m[2].strip(), 'Message_Content': m[3].strip()} for m in matches]
+        df = pd.DataFrame(data)
+        s['rows'] = len(df)
+
+    with stage('to_datetime', rows=len(df)):
+        df['Timestamp'] = pd.to_datetime(df['Date_Str'] + ' ' + df['Time_Str'], format='%d/%m/%y %H:%M:%S', errors='coerce')
+    df['Is_Poop'] = df['Message_Content'].str.contains('💩', regex=False)
+
+    with stage('locations', rows=len(df)):
+        # Logica Estrazione Posizione
+        df['Location'] = np.where(
+            (df['Message_Content'].str.contains(r'Posizione:|maps', regex=True).shift(-1) == True) &
+            (df['User'].shift(-1) == df['User']),
+            df['Message_Content'].shift(-1), None
+        )
+
+        # Filtra solo le cagate
+        df = df[df['Is_Poop'] == True].copy()
+
+        df['Latitude'], df['Longitude'] = extract_coords(df['Location'])
+        df = df.dropna(subset=['Latitude', 'Longitude'])
+
+    # Consumati testo, data e posizione: restano orario, utente e coordinate (tabella compatta)
+    return compact_events(normalize_users(df))
+
+def extract_coords(locations):
+    # Versione vettorizzata di find_coords: (latitudini, longitudini), NaN dove non c'è una posizione valida
+    coords = locations.str.extract(COORDS_RE)
+    missing = coords[0].isna() & locations.notna()
+    if missing.any():
+        coords.loc[missing] = locations[missing].str.extract(URL_COORDS_RE)
+    lats, lons = coords[0].astype(float), coords[1].astype(float)
+    outside = (lats.abs() > 90) | (lons.abs() > 180)
+    return lats.mask(outside), lons.mask(outside)
+
+def find_coords(text):
+    # Numeri fuori da ±90/±180 non sono una posizione (e non entrerebbero nelle coordinate int32 della tabella)
+    match = COORDS_RE.search(text) or URL_COORDS_RE.search(text)
+    if match is None:
+        return None
+    lat, lon = float(match.group(1)), float(match.group(2))
+    return (lat, lon) if abs(lat) <= 90 and abs(lon) <= 180 else None
+
+def normalize_name(name):
+    # Sostituzioni in sequenza, anche dentro nomi più lunghi (come con str.replace sulla colonna)
+    for k, v in USER_MAPPING.items():
+        name = name.replace(k, v)
+    return name
+
+def normalize_users(df):
+    # Un passaggio sui nomi distinti (pochi) e poi una sola mappatura per codice su tutte le righe
+    with stage('normalize_users', rows=len(df)):
+        codes, names = pd.factorize(df['User'])
+        normalized = np.array([normalize_name(name) for name in names], dtype=object)
+        if isinstance(df['User'].dtype, pd.CategoricalDtype):
+            # Tabella compatta: nuove categorie (due nomi possono diventare lo stesso), le righe restano codici
+            new_codes, new_names = pd.factorize(normalized, sort=True)
+            df['User'] = pd.Categorical.from_codes(new_codes[codes], categories=new_names)
+        else:
+            df['User'] = pd.Series(normalized[codes], index=df.index, dtype=df['User'].dtype)
+    return df
+
+def load_chat_data_streaming(file_name='_chat.txt', chunk_size=STREAM_CHUNK_SIZE):
+    # Lettura riga per riga: in memoria restano solo le cagate con posizione, a blocchi colonnari
+    print("📂 Lettura chat (streaming)...")
+    with stage('parse_lines'), open(file_name, 'r', encoding='utf-8') as f:
+        batches, _, _, _ = parse_lines(f, chunk_size=chunk_size)
+    return normalize_users(concat_batches(batches))
+
+def load_chat_data_parallel(file_name='_chat.txt', workers=4, chunk_size=STREAM_CHUNK_SIZE):
+    ranges = split_at_messages(file_name, workers)
+    print(f"📂 Lettura chat ({len(ranges)} blocchi in parallelo)...")
+    # Nei worker le misure per stadio non arrivano: qui resta il totale, CPU dei figli compresa
+    with stage('parse_parallel'), ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(_parse_range, [file_name] * len(ranges), *zip(*ranges), [chunk_size] * len(ranges)))
+
+    # Unione in ordine: cagata pendente risolta col primo messaggio del blocco dopo
+    batches = []
+    pending = None
+    for chunk_batches, n_messages, first_message, chunk_pending in results:
+        if pending is not None and first_message is not None:
+            columns = _empty_columns()
+            add_event(columns, pending, *first_message)
+            if columns['User']:
+                batches.append(columns_to_batch(columns))
+
+        batches.extend(chunk_batches)
+
+        if n_messages:
+            pending = chunk_pending
+
+    return normalize_users(concat_batches(batches))
+
+def load_chat_increment(file_name='_chat.txt', checkpoint=None, chunk_size=STREAM_CHUNK_SIZE, growing=False):
+    # Riprende dal checkpoint (offset in byte + cagata pendente) se la parte già letta non è cambiata.
+    # growing: la chat si sta ancora scrivendo (modalità live), un'ultima riga senza a capo resta per il giro dopo
+    if not os.path.exists(file_name):
+        raise FileNotFoundError(f"⚠️ ERRORE: '{file_name}' mancante!")
+
+    size = os.path.getsize(file_name)
+    resumed = checkpoint is not None and checkpoint['offset'] <= size and \
+        _prefix_hash(file_name, checkpoint['offset']) == checkpoint['prefix_hash']
+    start, pending = (checkpoint['offset'], checkpoint['pending']) if resumed else (0, None)
+
+    print(f"📂 Lettura chat ({'dal byte ' + str(start) if resumed else 'completa'})...")
+    with open(file_name, 'rb') as f:
+        f.seek(start)
+        data = f.read(size - start)
+    if growing:
+        # Solo righe complete: l'ultima potrebbe essere ancora in scrittura
+        data = data[:data.rfind(b'\n') + 1]
+
+    lines = io.TextIOWrapper(io.BytesIO(data), encoding='utf-8')
+    batches, _, _, pending = parse_lines(lines, pending, chunk_size)
+    df = normalize_users(concat_batches(batches))
+
+    end = start + len(data)
+    last_timestamp = df['Timestamp'].max() if len(df) else None
+    if resumed and (last_timestamp is None or pd.isna(last_timestamp)):
+        last_timestamp = checkpoint['last_timestamp']
+    new_checkpoint = {
+        'offset': end, 'pending': pending,
+        'prefix_hash': _prefix_hash(file_name, end), 'last_timestamp': last_timestamp
+    }
+    return df, new_checkpoint, resumed
+
+def _prefix_hash(file_name, offset, window=1 << 16):
+    # Impronta degli ultimi 64 KB prima dell'offset: basta a capire se l'export è stato riscritto
+    with open(file_name, 'rb') as f:
+        f.seek(max(0, offset - window))
+        return hashlib.sha256(f.read(offset - max(0, offset - window))).hexdigest()
+
+def split_at_messages(file_name, n_chunks):
+    # Confini in byte posti all'inizio di una riga "[...": nessun messaggio viene spezzato
+    size = os.path.getsize(file_name)
+    bounds = [0]
+    with open(file_name, 'rb') as f:
+        for k in range(1, n_chunks):
+            f.seek(max(size * k // n_chunks, bounds[-1]))
+            f.readline()
+            while True:
+                pos = f.tell()
+                line = f.readline()
+                if not line or line.startswith(b'['):
+                    break
+            if bounds[-1] < pos < size:
+                bounds.append(pos)
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+def _parse_range(file_name, start, end, chunk_size):
+    with open(file_name, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    # TextIOWrapper: stessa gestione dei fine riga della lettura in modalità testo
+    return parse_lines(io.TextIOWrapper(io.BytesIO(data), encoding='utf-8'), chunk_size=chunk_size)
+
+def parse_lines(lines, pending=None, chunk_size=STREAM_CHUNK_SIZE):
+    # pending: cagata ancora in attesa del messaggio successivo (da un blocco precedente)
+    columns = _empty_columns()
+    batches = []
+    first_message = None
+    n_messages = 0
+
+    for line in lines:
+        if not line.startswith('['):
+            continue
+        m = MESSAGE_RE.match(line)
+        if m is None:
+            continue
+
+        user = m.group(3).strip()
+        content = m.group(4).strip()
+        if first_message is None:
+            first_message = (user, content)
+
+        if pending is not None:
+            add_event(columns, pending, user, content)
+            if len(columns['User']) >= chunk_size:
+                batches.append(columns_to_batch(columns))
+                columns = _empty_columns()
+
+        pending = (m.group(1), m.group(2), user, content) if '💩' in content else None
+        n_messages += 1
+
+    if columns['User']:
+        batches.append(columns_to_batch(columns))
+    return batches, n_messages, first_message, pending
+
+def add_event(columns, poop, next_user, next_content):
+    # La posizione è il messaggio successivo, se dello stesso utente e con un link/posizione
+    date_str, time_str, user, content = poop
+    if next_user != user or not LOCATION_RE.search(next_content):
+        return
+    coords = find_coords(next_content)
+    if coords is None:
+        return
+
+    # Il testo dei due messaggi non serve più: si tengono solo data, ora, utente e coordinate
+    columns['Date_Str'].append(date_str)
+    columns['Time_Str'].append(time_str)
+    columns['User'].append(user)
+    columns['Latitude'].append(coords[0])
+    columns['Longitude'].append(coords[1])
+
+def _empty_columns():
+    return {name: [] for name in ['Date_Str', 'Time_Str', 'User', 'Latitude', 'Longitude']}
+
+def columns_to_batch(columns):
+    # Blocco già in forma compatta: le stringhe di data e ora vivono solo il tempo della conversione
+    when = pd.Series(columns['Date_Str'], dtype=str) + ' ' + pd.Series(columns['Time_Str'], dtype=str)
+    with stage('to_datetime', rows=len(when)):
+        timestamps = pd.to_datetime(when, format='%d/%m/%y %H:%M:%S', errors='coerce')
+    return compact_events(pd.DataFrame({
+        'Timestamp': timestamps, 'User': pd.Series(columns['User'], dtype=str),
+        'Latitude': np.array(columns['Latitude'], dtype=float), 'Longitude': np.array(columns['Longitude'], dtype=float),
+    }))
+
+def concat_batches(batches):
+    if not batches:
+        return columns_to_batch(_empty_columns())
+    return concat_events(batches)
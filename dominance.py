@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+
+class DominanceEngine:
+    # Chiave di confronto per ogni coppia (stato, utente): conteggio nei bit alti, ordine di prima
+    # comparsa (invertito) nei bassi. Il massimo della chiave è il vincitore di max(contenders, key=contenders.get):
+    # a pari conteggio vince chi è comparso per primo nello stato.
+    SEQ_BITS = 32
+    SEQ_MASK = (1 << SEQ_BITS) - 1
+
+    def __init__(self, n_users):
+        self.n_users = n_users
+        self.country_codes = {}
+        self.country_names = []
+        self.counts = np.zeros((0, n_users), dtype=np.int64)
+        self.first_seen = np.zeros((0, n_users), dtype=np.int64)
+        self.best_key = np.zeros(0, dtype=np.int64)
+        self.winner = np.zeros(0, dtype=np.int64)
+        self.n_seen = 0
+
+    def add(self, steps, countries, users):
+        # steps/users: codici interi per evento (ordinati per tempo); countries: nomi, "Unknown" non conta.
+        # Ritorna i cambi di vincitore come array (step, codice stato, codice utente), ordinati per step e stato.
+        steps = np.asarray(steps, dtype=np.int64)
+        users = np.asarray(users, dtype=np.int64)
+        # Nomi o categoriale (tabella compatta): in entrambi i casi si lavora sui codici
+        countries = pd.Categorical(countries)
+        seq = self.n_seen + np.arange(len(steps), dtype=np.int64)
+        self.n_seen += len(steps)
+
+        known = np.asarray(countries != "Unknown")
+        steps, users, seq = steps[known], users[known], seq[known]
+        codes = self._encode(countries[known])
+        if not len(codes):
+            return np.zeros((3, 0), dtype=np.int64)
+
+        # Conteggio cumulato e prima comparsa di ogni coppia, evento per evento
+        pair = codes * self.n_users + users
+        seen_before = self.counts[codes, users]
+        n = seen_before + pd.Series(pair).groupby(pair).cumcount().to_numpy() + 1
+        first = np.where(seen_before > 0, self.first_seen[codes, users],
+                         pd.Series(seq).groupby(pair).transform('first').to_numpy())
+        key = (n << self.SEQ_BITS) | (self.SEQ_MASK - first)
+
+        # Massimo corrente per stato (ripartendo da quello salvato) e posizione dell'evento che lo ha fissato
+        running = np.maximum(pd.Series(key).groupby(codes).cummax().to_numpy(), self.best_key[codes])
+        pos = np.where(running == key, np.arange(len(key)), -1)
+        pos = pd.Series(pos).groupby(codes).cummax().to_numpy()
+        winners = np.where(pos >= 0, users[np.maximum(pos, 0)], self.winner[codes])
+
+        # Vincitore a fine step: ultimo evento di ogni (step, stato), confrontato con lo step precedente dello stesso stato
+        previous_winner = self.winner.copy()
+        ends = pd.DataFrame({'step': steps, 'code': codes, 'winner': winners}).groupby(['step', 'code'], sort=True).last()
+        step_idx = ends.index.get_level_values('step').to_numpy()
+        code_idx = ends.index.get_level_values('code').to_numpy()
+        end_winner = ends['winner'].to_numpy()
+        before = ends.groupby(level='code')['winner'].shift().to_numpy()
+        first_of_code = np.isnan(before)
+        before = np.where(first_of_code, previous_winner[code_idx], np.nan_to_num(before)).astype(np.int64)
+        changed = end_winner != before
+
+        # Aggiornamento stato per il blocco successivo
+        self.first_seen[codes, users] = first
+        np.add.at(self.counts, (codes, users), 1)
+        last = pd.Series(np.arange(len(codes))).groupby(codes).last()
+        self.best_key[last.index.to_numpy()] = running[last.to_numpy()]
+        self.winner[last.index.to_numpy()] = winners[last.to_numpy()]
+
+        return np.vstack([step_idx[changed], code_idx[changed], end_winner[changed]])
+
+    def _encode(self, names):
+        # Codici degli stati in ordine di prima comparsa
+        local_codes, uniques = pd.factorize(names)
+        mapping = np.empty(len(uniques), dtype=np.int64)
+        for i, name in enumerate(uniques):
+            if name not in self.country_codes:
+                self.country_codes[name] = len(self.country_names)
+                self.country_names.append(name)
+            mapping[i] = self.country_codes[name]
+
+        grow = len(self.country_names) - len(self.winner)
+        if grow > 0:
+            self.counts = np.vstack([self.counts, np.zeros((grow, self.n_users), dtype=np.int64)])
+            self.first_seen = np.vstack([self.first_seen, np.zeros((grow, self.n_users), dtype=np.int64)])
+            self.best_key = np.r_[self.best_key, np.full(grow, -1, dtype=np.int64)]
+            self.winner = np.r_[self.winner, np.full(grow, -1, dtype=np.int64)]
+        return mapping[local_codes]
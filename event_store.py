@@ -0,0 +1,129 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+from config import EVENT_STORE_FILE, COORD_SCALE
+
+# Tabella eventi compatta (una riga = una 💩 con posizione): orario datetime64 (intero dall'epoch), utente e stato
+# come categorie (un codice int8/int16 per riga, i nomi una volta sola), coordinate in punto fisso int32.
+# Region (admin-1) c'è solo se GeoEngine ha il file delle regioni.
+# Il testo della chat non arriva fin qui: data_loader lo scarta appena ne ha estratto orario, utente e posizione
+EVENT_COLUMNS = ['Timestamp', 'User', 'Lat_E7', 'Lon_E7', 'Country', 'Region']
+CATEGORY_COLUMNS = ('User', 'Country', 'Region')
+METADATA_KEY = b'shitgram'
+
+def compact_events(df):
+    # Da un DataFrame di eventi qualunque (Latitude/Longitude float, nomi come stringhe) alla tabella compatta.
+    # COORD_SCALE = 1e7: le coordinate con al più 7 decimali (quelle dei link) tornano identiche in event_coords
+    lats, lons = event_coords(df)
+    events = pd.DataFrame({
+        'Timestamp': df['Timestamp'].to_numpy(),
+        'User': pd.Categorical(df['User']),
+        'Lat_E7': np.rint(lats * COORD_SCALE).astype(np.int32),
+        'Lon_E7': np.rint(lons * COORD_SCALE).astype(np.int32),
+    })
+    for column in ('Country', 'Region'):
+        if column in df:
+            events[column] = pd.Categorical(df[column])
+    return events
+
+def event_coords(df):
+    # (latitudini, longitudini) in gradi, float64; accetta anche tabelle non compatte (store vecchi, benchmark)
+    if 'Lat_E7' in df:
+        return df['Lat_E7'].to_numpy() / COORD_SCALE, df['Lon_E7'].to_numpy() / COORD_SCALE
+    return df['Latitude'].to_numpy(dtype=float), df['Longitude'].to_numpy(dtype=float)
+
+def assign_countries(df, geo_engine):
+    # Stato di ogni evento (e regione, se disponibile: cercata tra quelle dello stato), subito come categorie
+    lats, lons = event_coords(df)
+    countries = geo_engine.get_countries(lats, lons)
+    df['Country'] = pd.Categorical(countries)
+    if geo_engine.has_regions:
+        df['Region'] = pd.Categorical(geo_engine.get_regions(lats, lons, countries))
+    return df
+
+def concat_events(frames):
+    # pd.concat con categorie diverse tra i blocchi ripiega su stringhe object: le categorie si uniscono a parte
+    from pandas.api.types import union_categoricals
+    frames = [f for f in frames if len(f)] or frames[:1]
+    if len(frames) == 1:
+        return frames[0]
+    columns = [c for c in CATEGORY_COLUMNS if c in frames[0]]
+    events = pd.concat([f.drop(columns=columns) for f in frames], ignore_index=True)
+    for c in columns:
+        events[c] = union_categoricals([f[c] for f in frames])
+    return events[frames[0].columns]
+
+def store_available():
+    try:
+        import pyarrow
+    except ImportError:
+        return False
+    return True
+
+def _chat_fingerprint(chat_file, geo_hash):
+    stat = os.stat(chat_file)
+    return {'chat_size': stat.st_size, 'chat_mtime_ns': stat.st_mtime_ns, 'geo_hash': geo_hash}
+
+def save_events(df, chat_file, geo_hash=None, store_file=EVENT_STORE_FILE, fingerprint=None):
+    # Senza colonna Country (stadio parse della CLI) si salvano solo le altre.
+    # fingerprint: impronta della chat già letta da un altro store (stadio geolocate), al posto di quella del file
+    import pyarrow as pa
+
+    columns = [c for c in EVENT_COLUMNS if c in df]
+    events = df[columns].astype({c: 'category' for c in CATEGORY_COLUMNS if c in columns})
+    table = pa.Table.from_pandas(events, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    fingerprint = dict(fingerprint, geo_hash=geo_hash) if fingerprint else _chat_fingerprint(chat_file, geo_hash)
+    metadata[METADATA_KEY] = json.dumps(fingerprint).encode()
+    table = table.replace_schema_metadata(metadata)
+
+    tmp_file = store_file + ".tmp"
+    if store_file.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        pq.write_table(table, tmp_file)
+    else:
+        # Arrow IPC non compresso: si rilegge con memory map senza copie
+        import pyarrow.feather as feather
+        feather.write_feather(table, tmp_file, compression='uncompressed')
+    os.replace(tmp_file, store_file)
+    print(f"📦 Eventi salvati in {store_file} ({len(events)} righe)")
+
+def read_metadata(store_file=EVENT_STORE_FILE):
+    import pyarrow as pa
+
+    if store_file.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        schema = pq.read_schema(store_file)
+    else:
+        with pa.memory_map(store_file) as source:
+            schema = pa.ipc.open_file(source).schema
+    raw = (schema.metadata or {}).get(METADATA_KEY)
+    return json.loads(raw) if raw else None
+
+def is_fresh(chat_file, geo_hash=None, store_file=EVENT_STORE_FILE):
+    # Fresco = scritto a partire da questa stessa versione della chat (dimensione + mtime) e dello stesso GeoJSON
+    if not os.path.exists(store_file) or not os.path.exists(chat_file):
+        return False
+    try:
+        metadata = read_metadata(store_file)
+    except Exception:
+        return False
+    return metadata == _chat_fingerprint(chat_file, geo_hash)
+
+def load_events(store_file=EVENT_STORE_FILE, memory_map=True):
+    import pyarrow as pa
+
+    if store_file.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        table = pq.read_table(store_file, memory_map=memory_map)
+    else:
+        source = pa.memory_map(store_file) if memory_map else pa.OSFile(store_file)
+        table = pa.ipc.open_file(source).read_all()
+    print(f"📦 Eventi letti da {store_file} ({table.num_rows} righe)")
+    if 'Lat_E7' not in table.column_names:
+        # Store scritti prima delle coordinate in punto fisso: convertiti al volo
+        return compact_events(table.to_pandas())
+    # Già compatta (dizionari Arrow -> categorie): una colonna per blocco, senza consolidare, e buffer Arrow
+    # rilasciati man mano; le colonne senza valori nulli restano viste sul file mappato
+    return table.to_pandas(split_blocks=True, self_destruct=True)
@@ -1,41 +1,394 @@
-import requests
 import json
 import os
+import hashlib
+import pickle
+import sqlite3
+from collections import OrderedDict
+import numpy as np
+import shapely
 from shapely.geometry import shape, Point
 from shapely.prepared import prep
-from config import GEOJSON_URL
+from shapely.strtree import STRtree
+from profiling import stage
+from config import GEOJSON_URL, GEOJSON_FILE, GEOMETRY_CACHE_FILE, GEO_CACHE_FILE, GEO_CACHE_PRECISION, GEO_CACHE_SIZE
+from config import GEO_CACHE_ENABLED
+from config import REGIONS_FILE, REGIONS_CACHE_FILE
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def combine_hashes(source_hash, regions_hash):
+    # Impronta di tutto ciò che finisce negli eventi (stato e, se ci sono, regione): store e stato incrementale
+    if regions_hash is None or source_hash is None:
+        return source_hash
+    return hashlib.sha256((source_hash + regions_hash).encode()).hexdigest()
+
+def geometry_events_hash(geojson_file=GEOJSON_FILE, regions_file=REGIONS_FILE):
+    # Stessa impronta di GeoEngine.events_hash dai soli file, senza caricare i poligoni (None se manca il GeoJSON)
+    if not os.path.exists(geojson_file):
+        return None
+    regions_hash = file_sha256(regions_file) if regions_file and os.path.exists(regions_file) else None
+    return combine_hashes(file_sha256(geojson_file), regions_hash)
+
+class CountryCache:
+    # Chiave: lat/lon arrotondate a `precision` decimali e impacchettate in un unico int64
+    # (32 bit ciascuna, spostate in [0, 2^31) con OFFSET)
+    OFFSET = 1 << 30
+
+    def __init__(self, path=None, source_hash=None, precision=GEO_CACHE_PRECISION, max_size=GEO_CACHE_SIZE):
+        if 180 * 10 ** precision >= self.OFFSET:
+            # Oltre, una longitudine negativa esce dai suoi 32 bit e si confonde con la latitudine
+            raise ValueError(f"Precisione della cache stati troppo alta: {precision} (massimo 6 decimali)")
+        self.precision = precision
+        self.scale = 10 ** precision
+        self.max_size = max_size
+        self.memory = OrderedDict()
+        self.pending = {}
+        self.hits = 0
+        self.disk_loads = 0
+        self.misses = 0
+        self.db = None
+        # Senza hash della sorgente non si può invalidare: cache solo in memoria
+        if path and source_hash:
+            self.db = sqlite3.connect(path)
+            self._check_source(source_hash)
+
+    def _check_source(self, source_hash):
+        self.db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS points (key INTEGER PRIMARY KEY, country TEXT)")
+        meta = dict(self.db.execute("SELECT key, value FROM meta"))
+        expected = {'source_hash': source_hash, 'precision': str(self.precision)}
+        if meta != expected:
+            if meta:
+                print("♻️ Cache stati invalidata (GeoJSON o precisione cambiati)")
+            self.db.execute("DELETE FROM points")
+            self.db.execute("DELETE FROM meta")
+            self.db.executemany("INSERT INTO meta VALUES (?, ?)", expected.items())
+            self.db.commit()
+
+    def quantize(self, lats, lons):
+        qlat = np.round(lats * self.scale).astype(np.int64)
+        qlon = np.round(lons * self.scale).astype(np.int64)
+        return ((qlat + self.OFFSET) << 32) | (qlon + self.OFFSET)
+
+    def get_many(self, keys):
+        # (trovate {chiave: stato}, chiavi lette da disco, chiavi mancanti)
+        found = {}
+        from_disk = []
+        missing = []
+        for k in keys:
+            if k in self.memory:
+                self.memory.move_to_end(k)
+                found[k] = self.memory[k]
+            else:
+                missing.append(k)
+
+        if self.db is not None and missing:
+            for i in range(0, len(missing), 500):
+                chunk = missing[i:i + 500]
+                query = f"SELECT key, country FROM points WHERE key IN ({','.join('?' * len(chunk))})"
+                for k, country in self.db.execute(query, chunk):
+                    found[k] = country
+                    from_disk.append(k)
+                    self._remember(k, country)
+            missing = [k for k in missing if k not in found]
+        return found, from_disk, missing
+
+    def put_many(self, items):
+        for k, country in items:
+            self._remember(k, country)
+            self.pending[k] = country
+
+    def _remember(self, k, country):
+        self.memory[k] = country
+        self.memory.move_to_end(k)
+        if len(self.memory) > self.max_size:
+            self.memory.popitem(last=False)
+
+    def save(self):
+        if self.db is not None and self.pending:
+            self.db.executemany("INSERT OR REPLACE INTO points VALUES (?, ?)", self.pending.items())
+            self.db.commit()
+        self.pending = {}
+
+    def stats(self):
+        # Tutto in punti: hits = dalla memoria, disk_loads = dal file, misses = calcolati; hit rate = non calcolati
+        total = self.hits + self.disk_loads + self.misses
+        return {
+            'precision': self.precision, 'hits': self.hits, 'disk_loads': self.disk_loads,
+            'misses': self.misses, 'hit_rate': (self.hits + self.disk_loads) / total if total else 0.0,
+            'memory_size': len(self.memory)
+        }
 
 class GeoEngine:
-    def __init__(self):
-        self.geo_data = None
+    GEOMETRY_CACHE_VERSION = 1
+
+    def __init__(self, use_cache=GEO_CACHE_ENABLED, cache_precision=GEO_CACHE_PRECISION, regions_file=REGIONS_FILE):
+        self._geo_data = None
+        self._cached_geometry = None
+        self.source_hash = None
         self.countries_polys = []
-        self._load_geojson()
-        self._prepare_polygons()
+        with stage('geojson'):
+            self._load_geojson()
+        with stage('polygons') as s:
+            self._prepare_polygons()
+            s['rows'] = len(self.countries_polys)
+        with stage('regions') as s:
+            self._prepare_regions(regions_file)
+            s['rows'] = len(self.region_geoms)
+        with stage('country_cache'):
+            self.cache = CountryCache(GEO_CACHE_FILE, self.source_hash, cache_precision) if use_cache else None
+
+    @property
+    def geo_data(self):
+        # Il GeoJSON completo serve solo alla mappa: se i poligoni arrivano dalla cache binaria si legge su richiesta
+        if self._geo_data is None:
+            with open(GEOJSON_FILE, "r") as f:
+                self._geo_data = json.load(f)
+        return self._geo_data
 
     def _load_geojson(self):
         print("🌍 Setup GeoJSON...")
+        if not os.path.exists(GEOJSON_FILE):
+            # Si scarica solo se manca il file; requests importato qui per non rallentare l'avvio
+            import requests
+            r = requests.get(GEOJSON_URL)
+            self._geo_data = r.json()
+            with open(GEOJSON_FILE, "w") as f:
+                json.dump(self._geo_data, f)
+        # Una cache rotta non blocca nulla: _read_geometry_cache la scarta e si riparte dal GeoJSON locale
+        self._cached_geometry, self.source_hash = self._read_geometry_cache(GEOJSON_FILE, GEOMETRY_CACHE_FILE)
+        if self._cached_geometry is None and self._geo_data is None:
+            with open(GEOJSON_FILE, "r") as f:
+                self._geo_data = json.load(f)
+
+    def _read_geometry_cache(self, source_file, cache_file):
+        # (cache binaria con le geometrie già decodificate in 'geoms', o None se da rifare; sha256 del GeoJSON sorgente)
+        stat = os.stat(source_file)
         try:
-            if not os.path.exists("world_hires.json"):
-                r = requests.get(GEOJSON_URL)
-                self.geo_data = r.json()
-                with open("world_hires.json", "w") as f:
-                    json.dump(self.geo_data, f)
-            else:
-                with open("world_hires.json", "r") as f:
-                    self.geo_data = json.load(f)
-        except Exception:
-            self.geo_data = requests.get(GEOJSON_URL).json()
+            with open(cache_file, "rb") as f:
+                cached = pickle.load(f)
+            if cached.get('version') != self.GEOMETRY_CACHE_VERSION:
+                return None, file_sha256(source_file)
+            # WKB scritto da un'altra versione di shapely/GEOS o file troncato: si rifà dal GeoJSON
+            cached['geoms'] = shapely.from_wkb(cached['wkb'])
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError, KeyError, TypeError, ValueError,
+                shapely.errors.GEOSException):
+            return None, file_sha256(source_file)
+
+        if (cached['mtime'], cached['size']) != (stat.st_mtime_ns, stat.st_size):
+            # mtime cambiato: decide l'hash del contenuto
+            source_hash = file_sha256(source_file)
+            if source_hash != cached['sha256']:
+                return None, source_hash
+            cached['mtime'], cached['size'] = stat.st_mtime_ns, stat.st_size
+            self._write_geometry_cache({k: v for k, v in cached.items() if k != 'geoms'}, cache_file)
+
+        return cached, cached['sha256']
+
+    def _write_geometry_cache(self, cached, cache_file):
+        # Senza cache si va avanti lo stesso (cartella in sola lettura, disco pieno): la si rifà al prossimo avvio
+        tmp_file = cache_file + ".tmp"
+        try:
+            with open(tmp_file, "wb") as f:
+                pickle.dump(cached, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_file, cache_file)
+        except OSError as e:
+            print(f"⚠️ Cache geometrie non scritta ({cache_file}): {e}")
 
     def _prepare_polygons(self):
         print("🗺️ Preparazione poligoni...")
-        for feature in self.geo_data['features']:
-            geom = shape(feature['geometry'])
-            name = feature['properties'].get('ADMIN', feature['properties'].get('NAME', 'Unknown'))
+        if self._cached_geometry is not None:
+            names = self._cached_geometry['names']
+            geoms = self._cached_geometry['geoms']
+            self._cached_geometry = None
+        else:
+            names = []
+            geoms = []
+            for feature in self.geo_data['features']:
+                geoms.append(shape(feature['geometry']))
+                names.append(feature['properties'].get('ADMIN', feature['properties'].get('NAME', 'Unknown')))
+
+            if self.source_hash:
+                stat = os.stat(GEOJSON_FILE)
+                self._write_geometry_cache({
+                    'version': self.GEOMETRY_CACHE_VERSION, 'sha256': self.source_hash,
+                    'mtime': stat.st_mtime_ns, 'size': stat.st_size,
+                    'names': names, 'wkb': shapely.to_wkb(geoms).tolist()
+                }, GEOMETRY_CACHE_FILE)
+
+        for name, geom in zip(names, geoms):
             self.countries_polys.append({'name': name, 'poly': prep(geom)})
 
+        # Indice spaziale per le ricerche in blocco; l'ultimo nome è il fallback "Unknown"
+        self.countries_tree = STRtree(geoms)
+        self.countries_names = np.array(list(names) + ["Unknown"], dtype=object)
+
+    def _prepare_regions(self, regions_file):
+        # Secondo livello (admin-1), facoltativo: per ogni stato le sole sue regioni, con rettangoli e geometrie preparate.
+        # Nome di una regione = "Regione, Stato" (gli stessi nomi si ripetono in stati diversi)
+        self.regions_hash = None
+        self.region_geoms = []
+        self.region_bounds = np.zeros((0, 4))
+        self.region_countries = []
+        self.region_trees = {}
+        self.region_names = np.array(["Unknown"], dtype=object)
+        if not regions_file or not os.path.exists(regions_file):
+            return
+
+        cached, self.regions_hash = self._read_geometry_cache(regions_file, REGIONS_CACHE_FILE)
+        if cached is not None:
+            names, countries, geoms = cached['names'], cached['countries'], cached['geoms']
+        else:
+            print("🗺️ Preparazione regioni...")
+            with open(regions_file, "r") as f:
+                features = json.load(f)['features']
+            names, countries, geoms = [], [], []
+            for feature in features:
+                props = feature['properties']
+                country = props.get('admin', props.get('ADMIN'))
+                name = props.get('name') or props.get('name_en') or props.get('NAME') or props.get('iso_3166_2')
+                if feature['geometry'] is None or not country or not name:
+                    continue
+                geoms.append(shape(feature['geometry']))
+                names.append(f"{name}, {country}")
+                countries.append(country)
+            stat = os.stat(regions_file)
+            self._write_geometry_cache({
+                'version': self.GEOMETRY_CACHE_VERSION, 'sha256': self.regions_hash,
+                'mtime': stat.st_mtime_ns, 'size': stat.st_size,
+                'names': names, 'countries': countries, 'wkb': shapely.to_wkb(geoms).tolist()
+            }, REGIONS_CACHE_FILE)
+
+        self.region_geoms = np.asarray(geoms, dtype=object)
+        shapely.prepare(self.region_geoms)
+        self.region_bounds = shapely.bounds(self.region_geoms)
+        self.region_countries = list(countries)
+        # L'ultimo nome è il fallback "Unknown", come per gli stati
+        self.region_names = np.array(list(names) + ["Unknown"], dtype=object)
+        by_country = {}
+        for i, country in enumerate(countries):
+            by_country.setdefault(country, []).append(i)
+        for country, idx in by_country.items():
+            idx = np.array(idx, dtype=np.int64)
+            self.region_trees[country] = (STRtree(self.region_geoms[idx]), idx)
+
+    @property
+    def has_regions(self):
+        return bool(self.region_trees)
+
+    @property
+    def events_hash(self):
+        return combine_hashes(self.source_hash, self.regions_hash)
+
     def get_country(self, lat, lon):
+        if self.cache is not None:
+            return self.get_countries([lat], [lon])[0]
+
         p = Point(lon, lat)
         for c in self.countries_polys:
             if c['poly'].contains(p):
                 return c['name']
         return "Unknown"
+
+    def get_countries(self, lats, lons):
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        if self.cache is None:
+            return self._query_countries(lats, lons)
+
+        result = np.full(len(lats), "Unknown", dtype=object)
+        valid = np.flatnonzero(~(np.isnan(lats) | np.isnan(lons)))
+        keys, first, inverse, counts = np.unique(self.cache.quantize(lats[valid], lons[valid]),
+                                                 return_index=True, return_inverse=True, return_counts=True)
+        key_list = keys.tolist()
+
+        found, from_disk, missing = self.cache.get_many(key_list)
+        if missing:
+            # Una cella nuova si risolve sul primo suo punto reale (esatto per quello, non per gli altri della cella)
+            rows = np.searchsorted(keys, np.array(missing, dtype=np.int64))
+            with stage('query', rows=len(missing)):
+                computed = self._query_countries(lats[valid[first[rows]]], lons[valid[first[rows]]])
+            new_items = list(zip(missing, computed.tolist()))
+            self.cache.put_many(new_items)
+            found.update(new_items)
+
+        # Contatori per punto (una cella può averne molti)
+        points = dict(zip(key_list, counts.tolist()))
+        n_missing, n_disk = sum(points[k] for k in missing), sum(points[k] for k in from_disk)
+        self.cache.misses += n_missing
+        self.cache.disk_loads += n_disk
+        self.cache.hits += len(valid) - n_missing - n_disk
+        result[valid] = np.array([found[k] for k in key_list], dtype=object)[inverse]
+        return result
+
+    def _query_countries(self, lats, lons):
+        found = np.full(len(lats), len(self.countries_polys))
+
+        valid = np.flatnonzero(~(np.isnan(lats) | np.isnan(lons)))
+        points = shapely.points(lons[valid], lats[valid])
+        point_idx, country_idx = self.countries_tree.query(points, predicate='within')
+
+        # A parità di punto vince il primo stato nell'ordine del GeoJSON (come get_country)
+        if len(point_idx):
+            order = np.lexsort((country_idx, point_idx))
+            point_idx, country_idx = point_idx[order], country_idx[order]
+            first = np.r_[True, point_idx[1:] != point_idx[:-1]]
+            found[valid[point_idx[first]]] = country_idx[first]
+
+        return self.countries_names[found]
+
+    def get_regions(self, lats, lons, countries):
+        # Dal grossolano al fine: lo stato è già noto (get_countries), si cerca solo tra le regioni di quello stato
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        result = np.full(len(lats), len(self.region_names) - 1)
+        if not self.has_regions or not len(lats):
+            return self.region_names[result]
+
+        # Punti raggruppati per stato (codice = posizione in countries_names) con un ordinamento su interi
+        codes_by_name = {name: code for code, name in enumerate(self.countries_names.tolist())}
+        codes = np.fromiter((codes_by_name.get(c, -1) for c in countries), dtype=np.int64, count=len(lats))
+        codes[np.isnan(lats) | np.isnan(lons)] = -1
+        order = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(codes[order], np.arange(-1, len(self.countries_names) + 1))
+        for code, country in enumerate(self.countries_names.tolist()):
+            rows = order[bounds[code + 1]:bounds[code + 2]]
+            if len(rows) and country in self.region_trees:
+                result[rows] = self._query_regions(self.region_trees[country], lats[rows], lons[rows])
+        return self.region_names[result]
+
+    def _query_regions(self, tree_index, lats, lons):
+        tree, idx = tree_index
+        # Punti ordinati per longitudine: per ogni regione, nell'ordine del GeoJSON (a parità vince la prima),
+        # i candidati dentro il suo rettangolo sono una fetta contigua, e il test esatto si fa solo su quelli
+        order = np.argsort(lons, kind='stable')
+        xs, ys = lons[order], lats[order]
+        found = np.full(len(xs), -1)
+        for k, (x0, y0, x1, y1) in enumerate(self.region_bounds[idx].tolist()):
+            lo, hi = np.searchsorted(xs, x0, side='left'), np.searchsorted(xs, x1, side='right')
+            candidates = lo + np.flatnonzero((found[lo:hi] < 0) & (ys[lo:hi] >= y0) & (ys[lo:hi] <= y1))
+            if len(candidates):
+                inside = shapely.contains_xy(self.region_geoms[idx[k]], xs[candidates], ys[candidates])
+                found[candidates[inside]] = k
+        # Stato e regioni vengono da file diversi: sulla costa o sul confine un punto dello stato può cadere
+        # appena fuori da tutte le sue regioni, e gli si assegna la più vicina
+        outside = np.flatnonzero(found < 0)
+        if len(outside):
+            point_idx, region_idx = tree.query_nearest(shapely.points(xs[outside], ys[outside]))
+            first = np.r_[True, point_idx[1:] != point_idx[:-1]]
+            found[outside[point_idx[first]]] = region_idx[first]
+        result = np.empty(len(found), dtype=np.int64)
+        result[order] = idx[found]
+        return result
+
+    def save_cache(self):
+        if self.cache is not None:
+            self.cache.save()
+            s = self.cache.stats()
+            print(f"🗃️ Cache stati: {s['hits']} punti dalla memoria, {s['disk_loads']} dal disco, {s['misses']} calcolati, "
+                  f"hit rate {s['hit_rate']:.1%} @ {s['precision']} decimali")
@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+
+class EventHistory:
+    # Storico interrogabile per data, costruito dagli eventi geolocalizzati (una riga = una 💩).
+    # Gli eventi sono ordinati per tempo e numerati (seq); per ogni utente e per ogni coppia (stato, utente)
+    # si tengono le chiavi codice * n + seq, ordinate. Il numero di eventi di una chiave fino a un istante è
+    # quindi una ricerca binaria meno l'inizio del suo blocco (somma prefissa implicita), un intervallo è una differenza.
+    # Le regole sono quelle della timeline: righe senza orario escluse, "Unknown" conta nei totali ma non nel dominio,
+    # a pari conteggio in uno stato vince chi ci è arrivato per primo.
+    SEQ_BITS = 32
+    SEQ_MASK = (1 << SEQ_BITS) - 1
+
+    def __init__(self, df):
+        df = df[df['Timestamp'].notna()].sort_values(by='Timestamp', kind='stable')
+        self.times = df['Timestamp'].to_numpy(dtype='datetime64[ns]')
+        n = len(self.times)
+        seq = np.arange(n, dtype=np.int64)
+
+        user_codes, self.users = pd.factorize(df['User'].astype(str).to_numpy(), sort=True)
+        self.users = self.users.tolist()
+        self.user_keys, self.user_starts = self._index(user_codes, seq, len(self.users))
+
+        countries = df['Country'].astype(str).to_numpy()
+        known = countries != "Unknown"
+        country_codes, self.countries = pd.factorize(countries[known], sort=True)
+        self.countries = self.countries.tolist()
+        self.country_index = {c: i for i, c in enumerate(self.countries)}
+        pairs = country_codes * len(self.users) + user_codes[known]
+        self.pair_keys, self.pair_starts = self._index(pairs, seq[known], len(self.countries) * len(self.users))
+        # Prima comparsa di ogni coppia (per lo spareggio); le coppie mai viste restano a n
+        self.pair_first = np.full(len(self.pair_starts) - 1, n, dtype=np.int64)
+        seen = np.flatnonzero(np.diff(self.pair_starts))
+        self.pair_first[seen] = self.pair_keys[self.pair_starts[seen]] - seen * n
+
+    def _index(self, codes, seq, n_codes):
+        keys = np.sort(codes.astype(np.int64) * len(self.times) + seq)
+        starts = np.searchsorted(keys, np.arange(n_codes + 1, dtype=np.int64) * len(self.times))
+        return keys, starts
+
+    def __len__(self):
+        return len(self.times)
+
+    def _position(self, when, end):
+        # Quanti eventi cadono prima dell'istante (start: escluso, end: compreso). Una data senza ora come fine vale
+        # tutto il giorno: "chi aveva la Francia il 2024-03-01" guarda gli eventi fino alle 23:59:59 di quel giorno
+        if when is None:
+            return len(self.times) if end else 0
+        ts = pd.Timestamp(when)
+        if end and isinstance(when, str) and ts == ts.normalize() and ':' not in when:
+            ts += pd.Timedelta(days=1) - pd.Timedelta(1, unit='ns')
+        return int(np.searchsorted(self.times, np.datetime64(ts.as_unit('ns')), side='right' if end else 'left'))
+
+    def _counts(self, keys, starts, codes, position):
+        # Eventi di ogni codice con seq < position
+        return np.searchsorted(keys, codes * len(self.times) + position) - starts[codes]
+
+    def user_counts(self, start=None, end=None):
+        codes = np.arange(len(self.users), dtype=np.int64)
+        counts = self._counts(self.user_keys, self.user_starts, codes, self._position(end, True))
+        if start is not None:
+            counts = counts - self._counts(self.user_keys, self.user_starts, codes, self._position(start, False))
+        return dict(zip(self.users, counts.tolist()))
+
+    def leaderboard(self, start=None, end=None):
+        # [(utente, 💩 nell'intervallo)] dal primo all'ultimo, estremi compresi; senza estremi = da sempre / fino ad oggi
+        counts = self.user_counts(start, end)
+        return sorted(((u, c) for u, c in counts.items() if c), key=lambda item: -item[1])
+
+    def country_counts(self, country, start=None, end=None):
+        if country not in self.country_index:
+            return {}
+        codes = self.country_index[country] * len(self.users) + np.arange(len(self.users), dtype=np.int64)
+        counts = self._counts(self.pair_keys, self.pair_starts, codes, self._position(end, True))
+        if start is not None:
+            counts = counts - self._counts(self.pair_keys, self.pair_starts, codes, self._position(start, False))
+        return {u: c for u, c in zip(self.users, counts.tolist()) if c}
+
+    def owners(self, at=None):
+        # {stato: utente che lo domina} considerando gli eventi fino ad `at` compreso
+        position = self._position(at, True)
+        n_users = len(self.users)
+        counts = self._counts(self.pair_keys, self.pair_starts, np.arange(len(self.pair_first), dtype=np.int64), position)
+        # Stessa chiave di DominanceEngine: conteggio nei bit alti, prima comparsa (invertita) nei bassi
+        keys = np.where(counts > 0, (counts << self.SEQ_BITS) | (self.SEQ_MASK - self.pair_first), -1).reshape(-1, n_users)
+        if not keys.size:
+            return {}
+        winners = keys.argmax(axis=1)
+        held = keys.max(axis=1) >= 0
+        return {self.countries[c]: self.users[winners[c]] for c in np.flatnonzero(held).tolist()}
+
+    def owner(self, country, at=None):
+        counts = self.country_counts(country, end=at)
+        if not counts:
+            return None
+        first = self.pair_first[self.country_index[country] * len(self.users) + np.arange(len(self.users))]
+        return max(counts, key=lambda u: (counts[u], -first[self.users.index(u)]))
+
+def load_history(chat_file='_chat.txt', use_store=True):
+    # Eventi dallo store (o parsing + geolocalizzazione se la chat è cambiata), come main.py.
+    # GeoEngine si costruisce solo in quel secondo caso
+    from event_store import store_available
+    from main import load_geolocated
+    return EventHistory(load_geolocated(chat_file, use_store=use_store and store_available()))
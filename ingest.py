@@ -0,0 +1,70 @@
+import os
+import pickle
+from config import INGEST_STATE_FILE, GEOJSON_FILE, REGIONS_FILE
+from data_loader import load_chat_increment
+from event_store import assign_countries, concat_events
+from timeline import TimelineBuilder
+
+STATE_VERSION = 8
+
+def load_state(state_file=INGEST_STATE_FILE):
+    try:
+        with open(state_file, 'rb') as f:
+            state = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+    return state if state.get('version') == STATE_VERSION else None
+
+def save_state(state, state_file=INGEST_STATE_FILE):
+    tmp_file = state_file + ".tmp"
+    with open(tmp_file, 'wb') as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_file, state_file)
+
+def geometry_stamp():
+    # Dimensione e mtime dei file geografici: se non cambiano non serve nemmeno costruire GeoEngine per l'hash
+    stats = [os.stat(p) if os.path.exists(p) else None for p in (GEOJSON_FILE, REGIONS_FILE)]
+    return [(st.st_size, st.st_mtime_ns) if st else None for st in stats]
+
+def ingest_incremental(chat_file, make_geo_engine, state_file=INGEST_STATE_FILE, render_key=None):
+    # (eventi, timeline, motore geografico); motore None = niente di nuovo rispetto all'ultima mappa con le
+    # stesse opzioni (render_key), che quindi non va rifatta
+    state = load_state(state_file)
+    if state is not None and state['chat_file'] != os.path.abspath(chat_file):
+        state = None
+
+    new_df, checkpoint, resumed = load_chat_increment(chat_file, state['checkpoint'] if state else None)
+    print(f"🔁 {len(new_df)} nuovi eventi")
+
+    if resumed and not len(new_df) and state['geo_stamp'] == geometry_stamp() and state['render_key'] == render_key:
+        if checkpoint != state['checkpoint']:
+            # Solo messaggi senza posizione: si avanza il checkpoint per non rileggerli
+            save_state(dict(state, checkpoint=checkpoint), state_file)
+        return state['events'], state['timeline'], None
+
+    geo_engine = make_geo_engine()
+    print("📍 Assegnazione Stati ai Punti...")
+    assign_countries(new_df, geo_engine)
+    geo_engine.save_cache()
+
+    timeline = None
+    if resumed:
+        events = concat_events([state['events'], new_df])
+        if state['geo_hash'] != geo_engine.events_hash:
+            # GeoJSON (o file delle regioni) cambiato: stati e regioni storici vanno ricalcolati
+            assign_countries(events, geo_engine)
+        elif state['timeline'].can_extend(new_df):
+            timeline = state['timeline'].add(new_df)
+    else:
+        events = new_df
+
+    if timeline is None:
+        print("⏳ Calcolo Dominio e Timeline (da zero)...")
+        timeline = TimelineBuilder(sorted(events['User'].unique())).add(events)
+
+    save_state({
+        'version': STATE_VERSION, 'chat_file': os.path.abspath(chat_file), 'checkpoint': checkpoint,
+        'geo_hash': geo_engine.events_hash, 'geo_stamp': geometry_stamp(), 'render_key': render_key,
+        'events': events, 'timeline': timeline
+    }, state_file)
+    return events, timeline, geo_engine
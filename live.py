@@ -0,0 +1,218 @@
+import os
+import json
+import time
+import asyncio
+import numpy as np
+from config import PASTEL_HEX_MAP, USER_CONFIG, LIVE_HOST, LIVE_PORT, LIVE_POLL_INTERVAL, LIVE_CLIENT_QUEUE, MAP_RENDERER
+from config import LIVE_OUTPUT_FILE
+from data_loader import load_chat_increment
+from event_store import assign_countries, concat_events
+from geo_engine import GeoEngine
+from map_builder import create_map
+from map_geometry import prepare_map_geometry, prepare_region_geometry
+from timeline import TimelineBuilder, KEYFRAME_EVERY, encode_deltas
+
+class LiveState:
+    # Eventi e timeline in memoria, estesi con le sole righe aggiunte alla chat dall'ultimo controllo
+    def __init__(self, chat_file, geo_engine, keyframe_every=KEYFRAME_EVERY):
+        self.chat_file = chat_file
+        self.geo_engine = geo_engine
+        self.keyframe_every = keyframe_every
+        self.checkpoint = None
+        self.seen = None
+        # Eventi a blocchi, uniti solo quando servono tutti (reset, render): un aggiornamento non copia lo storico
+        self.frames = []
+        self.timeline = None
+        # Punti fino all'ultimo step e stato di ogni serie prima dello step (passo, stato): si portano avanti
+        # sui soli step nuovi, così un aggiornamento costa quanto gli eventi arrivati e non quanto la storia
+        self.n_points = 0
+        self.encoded = {}
+        # Stati le cui regioni sono già nella pagina
+        self.region_countries = set()
+
+    def poll(self):
+        # None = niente di nuovo, 'reset' = timeline ricalcolata da zero, altrimenti gli step da mandare alle pagine
+        stat = os.stat(self.chat_file)
+        growing = (stat.st_size, stat.st_mtime_ns) != self.seen
+        # Chat ferma da un controllo: un'ultima riga senza a capo è completa e si legge anche lei
+        if not growing and self.checkpoint['offset'] >= stat.st_size:
+            return None
+        self.seen = (stat.st_size, stat.st_mtime_ns)
+
+        new_df, self.checkpoint, resumed = load_chat_increment(self.chat_file, self.checkpoint, growing=growing)
+        if resumed and not len(new_df):
+            return None
+        assign_countries(new_df, self.geo_engine)
+
+        if resumed and self.timeline.can_extend(new_df):
+            dates = self.timeline.timeline_dates
+            s0 = max(len(dates) - 1, 0)
+            # Punti prima dello step s0, che potrebbe allungarsi con gli eventi nuovi
+            start = self.n_points - (len(self.timeline.data_by_time[dates[s0]]) if dates else 0)
+            self.frames.append(new_df)
+            self.timeline.add(new_df)
+            if self.timeline.has_regions and not set(new_df['Country'].unique()) <= self.region_countries:
+                # Stato nuovo: la pagina non ha le sue regioni e va rigenerata
+                self._reset_counters()
+                return 'reset'
+            return self._update(s0, start)
+
+        # Prima lettura, chat riscritta o utenti nuovi: si riparte da tutti gli eventi
+        self.frames = [concat_events(self.frames + [new_df]) if resumed else new_df]
+        self.timeline = TimelineBuilder(sorted(self.events['User'].unique())).add(self.events)
+        self._reset_counters()
+        return 'reset'
+
+    @property
+    def events(self):
+        if len(self.frames) > 1:
+            self.frames = [concat_events(self.frames)]
+        return self.frames[0] if self.frames else None
+
+    def _reset_counters(self):
+        ends = self.timeline.step_ends()
+        self.n_points = int(ends[-1]) if len(ends) else 0
+        self.encoded = {}
+
+    def _encode(self, name, changes, initial, s0):
+        # Keyframe e variazioni dallo step s0 in poi; lo stato prima di s0 si aggiorna solo con gli step
+        # diventati definitivi dall'ultima volta (gli step prima dell'ultimo non cambiano più)
+        end, state = self.encoded.get(name, (0, dict(initial or {})))
+        for step_changes in changes[end:s0]:
+            state.update(step_changes)
+        self.encoded[name] = (s0, state)
+        return encode_deltas(changes, state, self.keyframe_every, start=s0)
+
+    def _update(self, s0, start):
+        # Dallo step s0 in poi (l'ultimo già noto potrebbe essersi allungato): date, fine cumulata,
+        # punti nuovi e le variazioni/keyframe di dominio, classifica, XP e premi
+        timeline = self.timeline
+        dates = timeline.timeline_dates[s0:]
+        step_points = [timeline.data_by_time[d] for d in dates]
+        ends = (start + np.cumsum([len(p) for p in step_points], dtype=np.int64)).tolist()
+        points = [p for step in step_points for p in step][self.n_points - start:]
+        self.n_points = ends[-1] if ends else start
+        users = {u: 0 for u in timeline.unique_users}
+        series = [('dominance', timeline.dominance_changes, None), ('totals', timeline.user_totals_changes, users),
+                  ('xp', timeline.xp_changes, users), ('awards', timeline.award_changes, None)]
+        if timeline.has_regions:
+            series.append(('regions', timeline.region_changes, None))
+        parts = {name: self._encode(name, changes, initial, s0) for name, changes, initial in series}
+        return dict(parts, from_step=s0, dates=dates, step_end=ends, points=points)
+
+    def render(self, output_file, renderer=MAP_RENDERER, full_geometry=False):
+        # Pagina completa dello stato attuale (solo granularità al minuto: gli step arrivano uno alla volta)
+        timeline = self.timeline
+        users = timeline.unique_users
+        timeline_dates, data_by_time, dominance, totals = timeline.payload(self.keyframe_every)
+        xp, awards = timeline.awards_payload(self.keyframe_every)
+        js_user_colors = json.dumps({u: PASTEL_HEX_MAP.get(USER_CONFIG.get(u, {}).get('color'), 'gray') for u in users})
+        js_data = (json.dumps(timeline_dates), json.dumps(data_by_time), json.dumps(dominance), json.dumps(totals),
+                   js_user_colors, users)
+        # Livelli di dettaglio per tutti gli stati: quelli visitati cambiano mentre la pagina è aperta
+        # (con full_geometry il GeoJSON originale, che li ha già tutti)
+        geo_data, geo_levels = (self.geo_engine.geo_data, None) if full_geometry else prepare_map_geometry(self.geo_engine)
+        # Regioni invece solo degli stati visitati (sono molte di più): uno stato nuovo rigenera la pagina
+        regions = timeline.region_payload(self.keyframe_every)
+        self.region_countries = set(self.events['Country'].unique()) if regions is not None else set()
+        region_levels = prepare_region_geometry(self.geo_engine, visited=self.region_countries) if regions is not None else None
+        create_map(geo_data, js_data, output_file, open_browser=False, renderer=renderer, geo_levels=geo_levels,
+                   js_awards=(json.dumps(xp), json.dumps(awards)), live=True,
+                   js_regions=json.dumps(regions) if region_levels else None, region_levels=region_levels)
+        with open(output_file, 'rb') as f:
+            return f.read()
+
+class LiveServer:
+    # HTTP minimo su asyncio: "/" = mappa, "/events" = Server-Sent Events con gli aggiornamenti
+    def __init__(self, state, output_file, renderer=MAP_RENDERER, full_geometry=False, poll_interval=LIVE_POLL_INTERVAL):
+        self.state = state
+        self.output_file = output_file
+        self.renderer = renderer
+        self.full_geometry = full_geometry
+        self.poll_interval = poll_interval
+        self.clients = set()
+        self.page = None
+        self.reset_message = self._message('reset', {})
+
+    async def watch(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            t0 = time.perf_counter()
+            # Parsing e geolocalizzazione in un thread: intanto il server continua a rispondere
+            update = await asyncio.to_thread(self.state.poll)
+            if update is None:
+                continue
+            if update == 'reset':
+                self.page = await asyncio.to_thread(self.state.render, self.output_file, self.renderer, self.full_geometry)
+                self.broadcast('reset', {})
+                print(f"🔄 Timeline ricalcolata, {len(self.clients)} pagine ricaricate")
+            else:
+                self.broadcast('steps', update)
+                print(f"📡 {len(update['points'])} eventi nuovi a {len(self.clients)} pagine in {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+    def _message(self, event, data):
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode()
+
+    def broadcast(self, event, data):
+        message = self._message(event, data)
+        for queue in self.clients:
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # Pagina che non legge più: gli step arretrati si buttano e, se si riprende, si ricarica da capo
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(self.reset_message)
+
+    async def handle(self, reader, writer):
+        try:
+            request = await reader.readuntil(b'\r\n\r\n')
+            path = request.split(b' ', 2)[1].split(b'?')[0].decode()
+            if path == '/events':
+                await self.stream(writer)
+            elif path in ('/', '/index.html'):
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/html; charset=utf-8\r\n"
+                             b"Content-Length: %d\r\nConnection: close\r\n\r\n" % len(self.page) + self.page)
+                await writer.drain()
+            else:
+                writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+                await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.CancelledError, ConnectionError, IndexError):
+            pass
+        finally:
+            writer.close()
+
+    async def stream(self, writer):
+        queue = asyncio.Queue(maxsize=LIVE_CLIENT_QUEUE)
+        self.clients.add(queue)
+        try:
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n"
+                         b"Connection: keep-alive\r\n\r\n")
+            await writer.drain()
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    # Commento SSE ogni 15 s: tiene viva la connessione e scopre le pagine chiuse
+                    message = b": ping\n\n"
+                writer.write(message)
+                await writer.drain()
+        finally:
+            self.clients.discard(queue)
+
+    async def serve(self, host=LIVE_HOST, port=LIVE_PORT):
+        self.page = await asyncio.to_thread(self.state.render, self.output_file, self.renderer, self.full_geometry)
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"🟢 Mappa live su http://{host}:{port}/ (aggiornamenti da {self.state.chat_file})")
+        async with server:
+            await asyncio.gather(server.serve_forever(), self.watch())
+
+def run_live(chat_file='_chat.txt', output_file=LIVE_OUTPUT_FILE, renderer=MAP_RENDERER, full_geometry=False,
+             host=LIVE_HOST, port=LIVE_PORT):
+    state = LiveState(chat_file, GeoEngine())
+    state.poll()
+    try:
+        asyncio.run(LiveServer(state, output_file, renderer, full_geometry).serve(host, port))
+    except KeyboardInterrupt:
+        state.geo_engine.save_cache()
+        print("👋 Live terminato")
@@ -1,89 +1,410 @@
-import pandas as pd
+import os
+import sys
 import json
+import argparse
 import warnings
-from config import PASTEL_HEX_MAP, USER_CONFIG, sanitize_class_name
-from data_loader import load_chat_data
-from geo_engine import GeoEngine
-from map_builder import create_map
+from config import PASTEL_HEX_MAP, USER_CONFIG, PARSE_WORKERS, EVENT_STORE_FILE, MAP_RENDERER, MAP_RENDERERS
+from config import TIMELINE_GRANULARITY, MAP_GRANULARITIES, CHAT_FILE, PARSED_EVENTS_FILE, TIMELINE_FILE, MAP_OUTPUT_FILE
+from config import LIVE_OUTPUT_FILE
+from profiling import stage, enable as enable_profiling, write_report, run_cprofile
+
+# pandas, shapely (+ requests) e folium si importano dentro gli stadi che li usano: `--help` e gli stadi
+# di soli dati non pagano gli import della mappa (tempi con python -X importtime, vedi benchmarks/bench_startup.py)
 
 warnings.filterwarnings("ignore")
 
-def main():
-    # 1. Caricamento Dati
-    try:
-        df = load_chat_data('_chat.txt')
-    except Exception as e:
-        print(e)
-        return
+COMMANDS = ('parse', 'geolocate', 'timeline', 'render', 'all', 'history')
+
+def main(incremental=False, use_store=True, renderer=MAP_RENDERER, full_geometry=False, split_dir=None,
+         granularity=TIMELINE_GRANULARITY, chat_file=CHAT_FILE, output_file=MAP_OUTPUT_FILE, open_browser=True):
+    from event_store import store_available, save_events
+    from ingest import ingest_incremental
+    from timeline import build_timeline, parse_granularity
+
+    granularity = parse_granularity(granularity)
+    if use_store and not store_available():
+        print("⚠️ pyarrow non installato: store eventi disattivato")
+        use_store = False
+
+    # 1. Caricamento Dati (+ 2. Motore Geografico)
+    if incremental:
+        # Solo la coda nuova della chat viene letta e geolocalizzata, la timeline riparte dallo stato salvato
+        target = os.path.join(split_dir, 'index.html') if split_dir else output_file
+        render_key = (os.path.abspath(target), renderer, full_geometry, granularity)
+        try:
+            with stage('ingest_incremental') as s:
+                df, timeline, geo_engine = ingest_incremental(chat_file, build_geo_engine, render_key=render_key)
+                s['rows'] = len(df)
+        except Exception as e:
+            print(e)
+            return
+        if geo_engine is None:
+            if os.path.exists(target):
+                print(f"✅ Nessun evento nuovo: {target} è già aggiornata")
+                return
+            # Mappa cancellata nel frattempo: si rifà con gli eventi salvati
+            geo_engine = build_geo_engine()
+        if use_store:
+            with stage('save_events', rows=len(df)):
+                save_events(df, chat_file, geo_engine.events_hash)
+        unique_users = timeline.unique_users
+    else:
+        # 2. Setup Motore Geografico (serve prima: lo store è valido solo per lo stesso GeoJSON)
+        geo_engine = build_geo_engine()
+
+        try:
+            df = load_geolocated(chat_file, geo_engine, use_store)
+        except Exception as e:
+            print(e)
+            return
+
+        unique_users = sorted(df['User'].unique())
+
+        # 3. Elaborazione Temporale (Core Logic)
+        with stage('timeline', rows=len(df)):
+            timeline = build_timeline(df, unique_users)
+
+    render_map(df, timeline, geo_engine, output_file, renderer=renderer, full_geometry=full_geometry, split_dir=split_dir,
+               granularity=granularity, open_browser=open_browser)
+
+def build_geo_engine():
+    from geo_engine import GeoEngine
+    with stage('geo_engine'):
+        return GeoEngine()
 
-    unique_users = sorted(df['User'].unique())
+def load_geolocated(chat_file, geo_engine=None, use_store=True):
+    # Eventi con lo stato già assegnato: dallo store se è della stessa chat e dello stesso GeoJSON, altrimenti
+    # parsing + geolocalizzazione (e store riscritto). Senza geo_engine (history) il motore si costruisce solo
+    # se serve geolocalizzare: con lo store fresco bastano gli hash dei file
+    from data_loader import load_chat_data
+    from event_store import is_fresh, load_events, save_events, assign_countries
+    from geo_engine import geometry_events_hash
 
-    # 2. Setup Motore Geografico
-    geo_engine = GeoEngine()
-    
+    events_hash = geo_engine.events_hash if geo_engine is not None else geometry_events_hash()
+    if use_store and is_fresh(chat_file, events_hash):
+        with stage('load_events') as s:
+            df = load_events()
+            s['rows'] = len(df)
+        return df
+
+    with stage('load_chat_data') as s:
+        df = load_chat_data(chat_file, streaming=True, workers=PARSE_WORKERS)
+        s['rows'] = len(df)
+
+    if geo_engine is None:
+        geo_engine = build_geo_engine()
     print("📍 Assegnazione Stati ai Punti...")
-    df['Country'] = df.apply(lambda row: geo_engine.get_country(row['Latitude'], row['Longitude']), axis=1)
-
-    # 3. Elaborazione Temporale (Core Logic)
-    print("⏳ Calcolo Dominio e Timeline...")
-    df = df.sort_values(by='Timestamp')
-    timeline_dates = df['Timestamp'].dt.strftime('%Y-%m-%d %H:%M').unique().tolist()
-
-    data_by_time = {}
-    dominance_by_time = {}
-    user_totals_by_time = {}
-    geo_dominance_accum = {}
-    user_counts_accum = {u: 0 for u in unique_users}
-
-    for time_val in timeline_dates:
-        current_slice = df[df['Timestamp'].dt.strftime('%Y-%m-%d %H:%M') == time_val]
-        
-        # Aggiorna statistiche
-        for _, row in current_slice.iterrows():
-            u = row['User']
-            c = row['Country']
-            user_counts_accum[u] += 1
-            
-            if c != "Unknown":
-                if c not in geo_dominance_accum: geo_dominance_accum[c] = {}
-                geo_dominance_accum[c][u] = geo_dominance_accum[c].get(u, 0) + 1
-        
-        # Calcolo vincitori stati
-        current_map_colors = {}
-        for country, contenders in geo_dominance_accum.items():
-            winner = max(contenders, key=contenders.get)
-            winner_color = PASTEL_HEX_MAP.get(USER_CONFIG.get(winner, {}).get('color'), '#333')
-            current_map_colors[country] = winner_color
-            
-        dominance_by_time[time_val] = current_map_colors
-        user_totals_by_time[time_val] = user_counts_accum.copy()
-        
-        # Preparazione Markers
-        features_slice = []
-        for _, row in current_slice.iterrows():
-            user = row['User']
-            color = PASTEL_HEX_MAP.get(USER_CONFIG.get(user, {}).get('color', 'gray'), 'gray')
-            popup = f"<b>{user}</b><br>{row['Country']}<br>{row['Timestamp'].strftime('%H:%M')}"
-            features_slice.append({
-                "lat": row['Latitude'], "lon": row['Longitude'],
-                "user": user, "hex_color": color, 
-                "safe_class": sanitize_class_name(user),
-                "popup": popup
-            })
-        data_by_time[time_val] = features_slice
+    with stage('countries', rows=len(df)):
+        assign_countries(df, geo_engine)
+        geo_engine.save_cache()
+
+    if use_store:
+        with stage('save_events', rows=len(df)):
+            save_events(df, chat_file, geo_engine.events_hash)
+    return df
+
+def map_rollups(timeline, granularity=TIMELINE_GRANULARITY):
+    # Granularità selezionabili nella mappa, tutte raggruppando gli step al minuto (niente da ricalcolare)
+    from timeline import parse_granularity
+    granularity = parse_granularity(granularity)
+    granularities = [parse_granularity(g) for g in MAP_GRANULARITIES]
+    if granularity not in granularities:
+        granularities.append(granularity)
+    with stage('rollups'):
+        return {g: timeline.rollup(g) for g in granularities}
+
+def timeline_payload(timeline, visited, granularity=TIMELINE_GRANULARITY):
+    # Tutto quello che serve alla pagina, in tipi JSON: lo scrive `main.py timeline`, lo legge `main.py render`
+    rollups = map_rollups(timeline, granularity)
+    with stage('payload', rows=len(timeline.timeline_dates)):
+        timeline_dates, data_by_time, dominance_payload, totals_payload = timeline.payload()
+        xp_payload, awards_payload = timeline.awards_payload()
+    return {
+        'users': list(timeline.unique_users), 'visited': [str(c) for c in visited],
+        'dates': timeline_dates, 'data_by_time': data_by_time, 'dominance': dominance_payload, 'totals': totals_payload,
+        'xp': xp_payload, 'awards': awards_payload, 'regions': timeline.region_payload(),
+        'rollups': [[g, labels, last] for g, (labels, last) in rollups.items()],
+    }
+
+def page_geometry(geo_engine, visited, full_geometry=False):
+    if full_geometry:
+        return geo_engine.geo_data, None
+    # Geometrie semplificate per livello di zoom, dettaglio solo per gli stati visitati
+    from map_geometry import prepare_map_geometry
+    with stage('map_geometry'):
+        return prepare_map_geometry(geo_engine, visited=visited)
+
+def region_geometry(geo_engine, visited):
+    # Regioni (admin-1) degli stati visitati, per la vista del dominio per regione (None senza file delle regioni)
+    if not geo_engine.has_regions:
+        return None
+    from map_geometry import prepare_region_geometry
+    with stage('region_geometry'):
+        return prepare_region_geometry(geo_engine, visited=visited)
+
+def user_colors(users):
+    return json.dumps({u: PASTEL_HEX_MAP.get(USER_CONFIG.get(u, {}).get('color'), 'gray') for u in users})
+
+def render_payload(payload, geo_engine, output_file=MAP_OUTPUT_FILE, renderer=MAP_RENDERER, full_geometry=False,
+                   granularity=TIMELINE_GRANULARITY, open_browser=True):
+    from map_builder import create_map
+    from timeline import parse_granularity, rollup_steps
 
     # 4. Generazione Mappa
-    # Preparazione dati JSON per il frontend
-    js_data = (
-        json.dumps(timeline_dates),
-        json.dumps(data_by_time),
-        json.dumps(dominance_by_time),
-        json.dumps(user_totals_by_time),
-        json.dumps({u: PASTEL_HEX_MAP.get(USER_CONFIG.get(u, {}).get('color'), 'gray') for u in unique_users}),
-        unique_users
-    )
-
-    create_map(geo_engine.geo_data, js_data)
+    granularity = parse_granularity(granularity)
+    rollups = {g: (labels, last) for g, labels, last in payload['rollups']}
+    if granularity not in rollups:
+        # Granularità non preparata dallo stadio timeline: si raggruppano qui gli step al minuto
+        step_ends, total = [], 0
+        for d in payload['dates']:
+            total += len(payload['data_by_time'][d])
+            step_ends.append(total)
+        rollups[granularity] = rollup_steps(payload['dates'], step_ends, granularity)
+    base_geo, geo_levels = page_geometry(geo_engine, payload['visited'], full_geometry)
+    region_levels = region_geometry(geo_engine, payload['visited']) if payload.get('regions') else None
+
+    # Preparazione dati JSON per il frontend (dominio e classifica come keyframe + variazioni)
+    with stage('json', rows=len(payload['dates'])):
+        js_data = (
+            json.dumps(payload['dates']),
+            json.dumps(payload['data_by_time']),
+            json.dumps(payload['dominance']),
+            json.dumps(payload['totals']),
+            user_colors(payload['users']),
+            payload['users']
+        )
+        js_awards = (json.dumps(payload['xp']), json.dumps(payload['awards']))
+        js_regions = json.dumps(payload['regions']) if region_levels else None
+    with stage('create_map'):
+        create_map(base_geo, js_data, output_file, open_browser=open_browser, renderer=renderer, geo_levels=geo_levels,
+                   js_awards=js_awards, rollups=rollups, granularity=granularity, js_regions=js_regions, region_levels=region_levels)
+
+def render_map(df, timeline, geo_engine, output_file=MAP_OUTPUT_FILE, renderer=MAP_RENDERER, full_geometry=False,
+               split_dir=None, granularity=TIMELINE_GRANULARITY, open_browser=True):
+    # Dagli eventi geolocalizzati e dalla timeline alla pagina (usato anche da batch.py, una mappa per chat)
+    visited = df['Country'].unique()
+    if not split_dir:
+        render_payload(timeline_payload(timeline, visited, granularity), geo_engine, output_file, renderer=renderer,
+                       full_geometry=full_geometry, granularity=granularity, open_browser=open_browser)
+        return
+
+    # HTML leggero + file dati (binari e gzip) che la pagina scarica a blocchi
+    from data_export import write_data_files
+    from map_builder import create_map
+    from timeline import parse_granularity, KEYFRAME_EVERY
+    rollups = map_rollups(timeline, granularity)
+    base_geo, geo_levels = page_geometry(geo_engine, visited, full_geometry)
+    region_levels = region_geometry(geo_engine, visited) if timeline.has_regions else None
+    with stage('write_data_files', rows=len(df)):
+        manifest = write_data_files(df, timeline, split_dir, None if full_geometry else base_geo, geo_levels or [(0, base_geo)],
+                                    region_levels)
+    empty = json.dumps({'keyframe_every': KEYFRAME_EVERY, 'keyframes': [], 'deltas': []})
+    js_data = ("[]", "{}", empty, empty, user_colors(timeline.unique_users), timeline.unique_users)
+    with stage('create_map'):
+        create_map(None, js_data, os.path.join(split_dir, "index.html"), open_browser=False, renderer=renderer, manifest=manifest,
+                   rollups=rollups, granularity=parse_granularity(granularity), js_regions=empty if region_levels else None)
+    print(f"👉 La pagina legge i dati con fetch (non funziona da file://): python -m http.server -d {split_dir}")
+
+def require(path, command):
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"⚠️ ERRORE: '{path}' mancante! (si genera con: python main.py {command})")
+
+def parse_command(chat_file=CHAT_FILE, output_file=PARSED_EVENTS_FILE):
+    # Chat -> eventi con posizione, senza stato (niente shapely né folium)
+    from data_loader import load_chat_data
+    from event_store import save_events
+    with stage('load_chat_data') as s:
+        df = load_chat_data(chat_file, streaming=True, workers=PARSE_WORKERS)
+        s['rows'] = len(df)
+    with stage('save_events', rows=len(df)):
+        save_events(df, chat_file, store_file=output_file)
+
+def geolocate_command(input_file=PARSED_EVENTS_FILE, output_file=EVENT_STORE_FILE):
+    # Eventi -> stato di ogni punto. L'uscita è lo store eventi di main.py: con l'impronta della chat
+    # letta da parse, `main.py all` lo riusa finché la chat non cambia
+    from event_store import load_events, read_metadata, save_events, assign_countries
+    from geo_engine import GeoEngine
+    require(input_file, 'parse')
+    with stage('load_events') as s:
+        df = load_events(input_file)
+        s['rows'] = len(df)
+    with stage('geo_engine'):
+        geo_engine = GeoEngine()
+    print("📍 Assegnazione Stati ai Punti...")
+    with stage('countries', rows=len(df)):
+        assign_countries(df, geo_engine)
+        geo_engine.save_cache()
+    with stage('save_events', rows=len(df)):
+        save_events(df, None, geo_engine.events_hash, output_file, fingerprint=read_metadata(input_file))
+
+def timeline_command(input_file=EVENT_STORE_FILE, output_file=TIMELINE_FILE, granularity=TIMELINE_GRANULARITY):
+    # Eventi geolocalizzati -> dominio, classifica, premi e granularità della pagina, in JSON (niente shapely né folium)
+    from event_store import load_events
+    from timeline import build_timeline
+    require(input_file, 'geolocate')
+    with stage('load_events') as s:
+        df = load_events(input_file)
+        s['rows'] = len(df)
+    with stage('timeline', rows=len(df)):
+        timeline = build_timeline(df, sorted(df['User'].unique()))
+    payload = timeline_payload(timeline, df['Country'].unique(), granularity)
+    with stage('write_timeline'):
+        with open(output_file, 'w') as f:
+            json.dump(payload, f)
+    print(f"⏳ Timeline salvata in {output_file} ({len(payload['dates'])} step)")
+
+def render_command(input_file=TIMELINE_FILE, output_file=MAP_OUTPUT_FILE, renderer=MAP_RENDERER, full_geometry=False,
+                   granularity=TIMELINE_GRANULARITY, open_browser=True):
+    from geo_engine import GeoEngine
+    require(input_file, 'timeline')
+    with stage('read_timeline'):
+        with open(input_file) as f:
+            payload = json.load(f)
+    with stage('geo_engine'):
+        geo_engine = GeoEngine()
+    render_payload(payload, geo_engine, output_file, renderer, full_geometry, granularity, open_browser)
+
+def history_command(query, chat_file=CHAT_FILE, use_store=True, country=None, at=None, start=None, end=None):
+    # Interroga lo storico per data senza rigenerare la mappa
+    from history import load_history
+    history = load_history(chat_file, use_store)
+    if query == 'owner':
+        holder = history.owner(country, at)
+        print(f"👑 {country}: {holder}" if holder else f"🏳️ {country}: nessun dominatore")
+    elif query == 'owners':
+        for name, holder in sorted(history.owners(at).items()):
+            print(f"{name:<40} {holder}")
+    else:
+        board = history.leaderboard(start, end) if country is None else \
+            sorted(history.country_counts(country, start, end).items(), key=lambda item: -item[1])
+        for rank, (user, count) in enumerate(board, 1):
+            print(f"{rank:>3}. {user:<20} {count:>8} 💩")
+
+def build_parser():
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--profile', metavar='FILE', default=None,
+                        help="Misura tempo, CPU, memoria e righe di ogni stadio e le salva in FILE (JSON)")
+    common.add_argument('--profile-memory', action='store_true',
+                        help="Con --profile: picco delle allocazioni Python per stadio (tracemalloc, più lento)")
+    common.add_argument('--cprofile', metavar='FILE', default=None,
+                        help="Salva in FILE il profilo cProfile dell'intera esecuzione (da leggere con pstats)")
+
+    parser = argparse.ArgumentParser(description="Mappa del dominio 💩",
+                                     epilog="Senza comando si esegue `all` (es. python main.py --renderer webgl)")
+    commands = parser.add_subparsers(dest='command', metavar='{' + ','.join(COMMANDS) + '}')
+
+    cmd = commands.add_parser('parse', parents=[common], help=f"Chat -> eventi con posizione ({PARSED_EVENTS_FILE})")
+    cmd.add_argument('--chat', default=CHAT_FILE, help="Export della chat")
+    cmd.add_argument('--output', default=PARSED_EVENTS_FILE)
+
+    cmd = commands.add_parser('geolocate', parents=[common], help=f"Eventi -> stato di ogni punto ({EVENT_STORE_FILE})")
+    cmd.add_argument('--input', default=PARSED_EVENTS_FILE)
+    cmd.add_argument('--output', default=EVENT_STORE_FILE)
+
+    cmd = commands.add_parser('timeline', parents=[common], help=f"Eventi geolocalizzati -> dati della pagina ({TIMELINE_FILE})")
+    cmd.add_argument('--input', default=EVENT_STORE_FILE)
+    cmd.add_argument('--output', default=TIMELINE_FILE)
+    cmd.add_argument('--granularity', default=TIMELINE_GRANULARITY,
+                     help="Granularità da preparare oltre a quelle della pagina: minute, hour, day, week, month o N")
+
+    renderer_help = "Disegno dei marker: svg, canvas o webgl (per decine di migliaia di punti)"
+    granularity_help = "Step della timeline all'apertura: minute, hour, day, week, month o N (eventi per step)"
+    geometry_help = "Incorpora il GeoJSON originale a piena risoluzione invece dei livelli semplificati"
+    cmd = commands.add_parser('render', parents=[common], help=f"Dati della pagina -> mappa HTML ({MAP_OUTPUT_FILE})")
+    cmd.add_argument('--input', default=TIMELINE_FILE)
+    cmd.add_argument('--output', default=MAP_OUTPUT_FILE)
+    cmd.add_argument('--renderer', choices=MAP_RENDERERS, default=MAP_RENDERER, help=renderer_help)
+    cmd.add_argument('--full-geometry', action='store_true', help=geometry_help)
+    cmd.add_argument('--granularity', default=TIMELINE_GRANULARITY, help=granularity_help)
+    cmd.add_argument('--no-open', dest='open_browser', action='store_false', help="Non apre il browser")
+
+    cmd = commands.add_parser('all', parents=[common], help="Tutta la pipeline, dalla chat alla mappa (default)")
+    cmd.add_argument('--chat', default=CHAT_FILE, help="Export della chat")
+    cmd.add_argument('--output', default=None, help=f"Mappa HTML (default {MAP_OUTPUT_FILE}, con --live {LIVE_OUTPUT_FILE})")
+    cmd.add_argument('--incremental', action='store_true',
+                     help="Rilegge solo i messaggi nuovi partendo dallo stato salvato dell'ultima esecuzione")
+    cmd.add_argument('--no-store', action='store_true',
+                     help="Ignora lo store eventi (%s) e rifà parsing e geolocalizzazione" % EVENT_STORE_FILE)
+    cmd.add_argument('--renderer', choices=MAP_RENDERERS, default=MAP_RENDERER, help=renderer_help)
+    cmd.add_argument('--full-geometry', action='store_true', help=geometry_help)
+    cmd.add_argument('--split', metavar='DIR', default=None,
+                     help="Scrive in DIR un HTML leggero (index.html) e i dati in file separati scaricati dalla pagina")
+    cmd.add_argument('--granularity', default=TIMELINE_GRANULARITY, help=granularity_help)
+    cmd.add_argument('--live', action='store_true',
+                     help="Server locale con la mappa che si aggiorna da sola quando la chat cresce (SSE)")
+    cmd.add_argument('--no-open', dest='open_browser', action='store_false', help="Non apre il browser")
+
+    cmd = commands.add_parser('history', parents=[common], help="Interroga lo storico delle 💩 per data senza rigenerare la mappa")
+    cmd.add_argument('--chat', default=CHAT_FILE, help="Export della chat")
+    cmd.add_argument('--no-store', action='store_true',
+                     help="Ignora lo store eventi (%s) e rifà parsing e geolocalizzazione" % EVENT_STORE_FILE)
+    queries = cmd.add_subparsers(dest='query', required=True)
+    query = queries.add_parser('owner', help="Chi domina uno stato a una certa data")
+    query.add_argument('country')
+    query.add_argument('--at', default=None, help="Data o data e ora (default: oggi)")
+    query = queries.add_parser('owners', help="Tutti gli stati con il loro dominatore a una certa data")
+    query.add_argument('--at', default=None)
+    query = queries.add_parser('leaderboard', help="Classifica tra due date (estremi compresi)")
+    query.add_argument('--from', dest='start', default=None)
+    query.add_argument('--to', dest='end', default=None)
+    query.add_argument('--country', default=None, help="Solo le 💩 in questo stato")
+    return parser
 
 if __name__ == "__main__":
-    main()
+    argv = sys.argv[1:]
+    # Senza comando (anche con le sole opzioni di sempre) si esegue tutta la pipeline
+    if not argv or (argv[0] not in COMMANDS and argv[0] not in ('-h', '--help')):
+        argv = ['all'] + argv
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == 'all' and args.output is None:
+        args.output = LIVE_OUTPUT_FILE if args.live else MAP_OUTPUT_FILE
+
+    if args.command == 'all' and args.live:
+        # La pagina live riceve gli step al minuto uno alla volta, in un solo HTML
+        if args.split:
+            parser.error("--split non è disponibile con --live")
+        if args.granularity != 'minute':
+            parser.error("--live mostra solo la timeline al minuto (--granularity minute)")
+        # Import qui: il server serve solo in questa modalità
+        from live import run_live
+        run_live(args.chat, output_file=args.output, renderer=args.renderer, full_geometry=args.full_geometry)
+        raise SystemExit
+
+    if args.command == 'parse':
+        run, options = parse_command, dict(chat_file=args.chat, output_file=args.output)
+    elif args.command == 'geolocate':
+        run, options = geolocate_command, dict(input_file=args.input, output_file=args.output)
+    elif args.command == 'timeline':
+        run, options = timeline_command, dict(input_file=args.input, output_file=args.output, granularity=args.granularity)
+    elif args.command == 'render':
+        run, options = render_command, dict(input_file=args.input, output_file=args.output, renderer=args.renderer,
+                                            full_geometry=args.full_geometry, granularity=args.granularity,
+                                            open_browser=args.open_browser)
+    elif args.command == 'history':
+        run, options = history_command, dict(query=args.query, chat_file=args.chat, use_store=not args.no_store,
+                                             country=getattr(args, 'country', None), at=getattr(args, 'at', None),
+                                             start=getattr(args, 'start', None), end=getattr(args, 'end', None))
+    else:
+        run, options = main, dict(incremental=args.incremental, use_store=not args.no_store, renderer=args.renderer,
+                                  full_geometry=args.full_geometry, split_dir=args.split, granularity=args.granularity,
+                                  chat_file=args.chat, output_file=args.output, open_browser=args.open_browser)
+
+    if args.command in ('parse', 'geolocate', 'timeline'):
+        from event_store import store_available
+        if not store_available():
+            sys.exit(f"⚠️ pyarrow non installato: serve per i file degli stadi ({args.command})")
+
+    if args.profile:
+        enable_profiling(trace_memory=args.profile_memory)
+    try:
+        with stage('main'):
+            if args.cprofile:
+                run_cprofile(run, args.cprofile, **options)
+            else:
+                run(**options)
+    except FileNotFoundError as e:
+        sys.exit(str(e))
+    finally:
+        if args.profile:
+            write_report(args.profile)
@@ -0,0 +1,88 @@
+import os
+import json
+import pickle
+import numpy as np
+import shapely
+from config import MAP_GEOMETRY_LEVELS, MAP_GEOMETRY_CACHE_FILE, REGIONS_LEVELS_CACHE_FILE
+
+CACHE_VERSION = 1
+# Livelli già letti o calcolati in questo processo: con più mappe di fila (batch.py) il file si legge una volta,
+# e i processi figli creati con fork li ereditano senza rileggerlo
+_levels_memo = {}
+
+def simplify_coverage(geoms, tolerance):
+    # I confini condivisi vengono semplificati una volta sola per entrambi gli stati: niente buchi o sovrapposizioni
+    if hasattr(shapely, 'coverage_simplify'):
+        simplified = shapely.coverage_simplify(geoms, tolerance)
+    else:
+        simplified = shapely.simplify(geoms, tolerance, preserve_topology=True)
+    # Coordinate arrotondate a un decimo della tolleranza: meno cifre nel JSON, differenza invisibile
+    digits = max(0, int(np.ceil(-np.log10(tolerance / 10))))
+    return shapely.transform(simplified, lambda coords: np.round(coords, digits))
+
+def _load_levels(source_hash, tolerances, cache_file):
+    try:
+        with open(cache_file, 'rb') as f:
+            cached = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+    if cached.get('version') != CACHE_VERSION or cached.get('sha256') != source_hash or cached.get('tolerances') != tolerances:
+        return None
+    return cached['levels']
+
+def _save_levels(source_hash, tolerances, levels, cache_file):
+    tmp_file = cache_file + ".tmp"
+    with open(tmp_file, 'wb') as f:
+        pickle.dump({'version': CACHE_VERSION, 'sha256': source_hash, 'tolerances': tolerances, 'levels': levels},
+                    f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_file, cache_file)
+
+def _feature_collection(names, geometries, keep, key="ADMIN"):
+    return {"type": "FeatureCollection", "features": [
+        {"type": "Feature", "properties": {key: name}, "geometry": json.loads(geometry)}
+        for name, geometry in zip(names, geometries) if geometry is not None and keep(name)
+    ]}
+
+def _simplified_levels(source_hash, geoms, tolerances, cache_file):
+    # GeoJSON semplificato per ogni tolleranza: dalla memoria del processo, dal file di cache o ricalcolato
+    memo_key = (source_hash, tolerances, cache_file)
+    cached = _levels_memo.get(memo_key) if source_hash else None
+    if cached is None and source_hash:
+        cached = _load_levels(source_hash, tolerances, cache_file)
+    if cached is None:
+        print("✂️ Semplificazione geometrie per la mappa...")
+        cached = []
+        for tolerance in tolerances:
+            simplified = simplify_coverage(geoms, tolerance)
+            cached.append([None if g.is_empty else shapely.to_geojson(g) for g in simplified])
+        if source_hash:
+            _save_levels(source_hash, tolerances, cached, cache_file)
+    if source_hash:
+        _levels_memo[memo_key] = cached
+    return cached
+
+def prepare_map_geometry(geo_engine, visited=None, levels=MAP_GEOMETRY_LEVELS, cache_file=MAP_GEOMETRY_CACHE_FILE):
+    # Ritorna (base, livelli): base = stati mai visitati, solo alla risoluzione più grossolana;
+    # livelli = [(zoom minimo, FeatureCollection degli stati visitati)] da alternare in base allo zoom
+    tolerances = tuple(t for _, t in levels)
+    names = geo_engine.countries_names[:-1].tolist()
+    cached = _simplified_levels(geo_engine.source_hash, geo_engine.countries_tree.geometries, tolerances, cache_file)
+
+    if visited is None:
+        return None, [(zoom, _feature_collection(names, geometries, lambda n: True)) for (zoom, _), geometries in zip(levels, cached)]
+
+    visited = set(visited)
+    base = _feature_collection(names, cached[0], lambda n: n not in visited)
+    return base, [(zoom, _feature_collection(names, geometries, lambda n: n in visited)) for (zoom, _), geometries in zip(levels, cached)]
+
+def prepare_region_geometry(geo_engine, visited=None, levels=MAP_GEOMETRY_LEVELS, cache_file=REGIONS_LEVELS_CACHE_FILE):
+    # Livelli [(zoom minimo, FeatureCollection)] delle regioni degli stati visitati (tutte se visited è None),
+    # sempre semplificati: sono migliaia e servono solo quando si sceglie la vista per regione. None senza regioni
+    if not geo_engine.has_regions:
+        return None
+    tolerances = tuple(t for _, t in levels)
+    names = geo_engine.region_names[:-1].tolist()
+    cached = _simplified_levels(geo_engine.regions_hash, geo_engine.region_geoms, tolerances, cache_file)
+    visited = None if visited is None else set(visited)
+    kept = {name for name, country in zip(names, geo_engine.region_countries) if visited is None or country in visited}
+    return [(zoom, _feature_collection(names, geometries, lambda n: n in kept, key="NAME")) for (zoom, _), geometries in zip(levels, cached)]
@@ -0,0 +1,104 @@
+import os
+import sys
+import json
+import time
+import cProfile
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    # Windows: niente getrusage, il picco RSS resta vuoto
+    resource = None
+
+# Misure per stadio della pipeline (tempo reale, CPU, picco di memoria, righe), raccolte solo dopo enable().
+# Gli stadi annidati hanno percorso "padre/figlio"; lo stesso percorso ripetuto (es. un blocco alla volta) si somma
+_records = {}
+_stack = []
+_enabled = False
+
+def enable(trace_memory=False):
+    # trace_memory: picco delle allocazioni per stadio con tracemalloc (preciso, ma rallenta l'esecuzione)
+    global _enabled
+    _enabled = True
+    _records.clear()
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+def _cpu_time():
+    # CPU di questo processo + dei figli già terminati (i worker del parsing in parallelo)
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux lo dà in KB, macOS in byte
+    return peak / (1 << 20) if sys.platform == 'darwin' else peak / 1024
+
+@contextmanager
+def stage(name, rows=None):
+    # with stage('timeline') as s: ...; s['rows'] = len(df)
+    info = {'rows': rows}
+    if not _enabled:
+        yield info
+        return
+
+    path = f"{_stack[-1]['path']}/{name}" if _stack else name
+    record = _records.setdefault(path, {'stage': path, 'calls': 0, 'wall_s': 0.0, 'cpu_s': 0.0,
+                                        'rows': None, 'rss_peak_mb': None, 'py_peak_mb': None})
+    frame = {'path': path, 'child_peak': 0}
+    _stack.append(frame)
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        # Il picco si azzera per misurare solo questo stadio: quello accumulato finora passa al padre
+        outer_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.reset_peak()
+    wall, cpu = time.perf_counter(), _cpu_time()
+    try:
+        yield info
+    finally:
+        wall, cpu = time.perf_counter() - wall, _cpu_time() - cpu
+        _stack.pop()
+        record['calls'] += 1
+        record['wall_s'] += wall
+        record['cpu_s'] += cpu
+        if info['rows'] is not None:
+            record['rows'] = (record['rows'] or 0) + int(info['rows'])
+        record['rss_peak_mb'] = _peak_rss_mb()
+        if tracing:
+            peak = max(tracemalloc.get_traced_memory()[1], frame['child_peak'])
+            record['py_peak_mb'] = max(record['py_peak_mb'] or 0, peak / (1 << 20))
+            if _stack:
+                _stack[-1]['child_peak'] = max(_stack[-1]['child_peak'], peak, outer_peak)
+
+def report():
+    stages = [{k: round(v, 4) if isinstance(v, float) else v for k, v in r.items()} for r in _records.values()]
+    return {'python': sys.version.split()[0], 'pid': os.getpid(), 'stages': stages}
+
+def print_summary():
+    print(f"\n{'stadio':<44} {'chiamate':>8} {'reale (s)':>10} {'CPU (s)':>9} {'RSS (MB)':>9} {'py (MB)':>8} {'righe':>10}")
+    for r in _records.values():
+        depth = r['stage'].count('/')
+        name = '  ' * depth + r['stage'].rsplit('/', 1)[-1]
+        rss = f"{r['rss_peak_mb']:.0f}" if r['rss_peak_mb'] is not None else '-'
+        py = f"{r['py_peak_mb']:.1f}" if r['py_peak_mb'] is not None else '-'
+        rows = r['rows'] if r['rows'] is not None else '-'
+        print(f"{name:<44} {r['calls']:>8} {r['wall_s']:>10.3f} {r['cpu_s']:>9.3f} {rss:>9} {py:>8} {rows:>10}")
+
+def write_report(path):
+    with open(path, 'w') as f:
+        json.dump(report(), f, indent=2)
+    print_summary()
+    print(f"⏱️ Profilo per stadio salvato in {path}")
+
+def run_cprofile(func, pstats_file, *args, **kwargs):
+    # Profilo a livello di funzione dell'intera esecuzione, da leggere con: python -m pstats <file>
+    profile = cProfile.Profile()
+    try:
+        return profile.runcall(func, *args, **kwargs)
+    finally:
+        profile.dump_stats(pstats_file)
+        print(f"🔬 cProfile salvato in {pstats_file} (python -m pstats {pstats_file})")
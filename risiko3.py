@@ -1,13 +1,7 @@
-import pandas as pd
 import re
-import numpy as np
-import folium
 import os
 import webbrowser
 import json
-import requests
-from shapely.geometry import shape, Point
-from shapely.prepared import prep
 import warnings
 
 # ==========================================
@@ -52,168 +46,190 @@ def sanitize_class_name(name): return re.sub(r'[^a-zA-Z0-9]', '_', name)
 # 📥 2. CARICAMENTO DATI
 # ==========================================
 
-FILE_NAME = '_chat.txt'
-if not os.path.exists(FILE_NAME):
-    print(f"⚠️ ERRORE: '{FILE_NAME}' mancante!")
-    exit()
-
-print("1. Lettura chat...")
-with open(FILE_NAME, 'r', encoding='utf-8') as f: chat_content = f.read()
-
-matches = re.findall(r"^\[(\d{2}\/\d{2}\/\d{2}),\s(\d{2}:\d{2}:\d{2})\]\s([^:]+):\s(.*)$", chat_content, re.MULTILINE)
-data = [{'Date_Str': m[0], 'Time_Str': m[1], 'User': m[2].strip(), 'Message_Content': m[3].strip()} for m in matches]
-df = pd.DataFrame(data)
-df['Timestamp'] = pd.to_datetime(df['Date_Str'] + ' ' + df['Time_Str'], format='%d/%m/%y %H:%M:%S', errors='coerce')
-df['Is_Poop'] = df['Message_Content'].str.contains('💩', regex=False)
-
-# Logica Estrazione Posizione
-df['Location'] = np.where(
-    (df['Message_Content'].str.contains(r'Posizione:|maps', regex=True).shift(-1) == True) & 
-    (df['User'].shift(-1) == df['User']), 
-    df['Message_Content'].shift(-1), None
-)
-df = df[df['Is_Poop'] == True].copy()
-
-def get_coords(text):
-    match = re.search(r'(-?\d+\.\d+),\s*(-?\d+\.\d+)', str(text))
-    return (float(match.group(1)), float(match.group(2))) if match else (np.nan, np.nan)
-
-df[['Latitude', 'Longitude']] = df['Location'].apply(get_coords).apply(pd.Series)
-df = df.dropna(subset=['Latitude', 'Longitude'])
-
-# Mapping Utenti
-user_mapping = {
-    'cosimobicci': 'Cosimo', 'riki nata': 'Riccardo', 'Federation non è rotto qualcosa Yonghong': 'Armando',
-    'Maurizio dalla sezione Marketing': 'Tommaso', 'Asia Mariani': 'Asia', 'Stefano Panichi': 'Stefano',
-    'Leo Chelsea': 'Leo', 'Luca Viezzoli': 'Luca', 'mariam': 'Mariam', 'Francesca Piersigilli': 'Francesca'
-}
-for k, v in user_mapping.items(): df['User'] = df['User'].str.replace(k, v, regex=False)
-unique_users = sorted(df['User'].unique())
-
-# ==========================================
-# 🌍 3. GEOMETRIA & LOGICA DOMINIO
-# ==========================================
-print("2. Setup GeoJSON e Poligoni...")
-try:
-    if not os.path.exists("world_hires.json"):
-        r = requests.get(GEOJSON_URL)
-        geo_data = r.json()
-        with open("world_hires.json", "w") as f: json.dump(geo_data, f)
-    else:
-        with open("world_hires.json", "r") as f: geo_data = json.load(f)
-except Exception as e:
-    geo_data = requests.get(GEOJSON_URL).json()
-
-# Prepara poligoni per ricerca veloce
-countries_polys = []
-for feature in geo_data['features']:
-    geom = shape(feature['geometry'])
-    name = feature['properties'].get('ADMIN', feature['properties'].get('NAME', 'Unknown'))
-    countries_polys.append({'name': name, 'poly': prep(geom)}) 
-
-def get_country(lat, lon):
-    p = Point(lon, lat)
-    for c in countries_polys:
-        if c['poly'].contains(p): return c['name']
-    return "Unknown"
-
-print("3. Assegnazione Stati ai Punti...")
-df['Country'] = df.apply(lambda row: get_country(row['Latitude'], row['Longitude']), axis=1)
-
-# ==========================================
-# 📊 4. ELABORAZIONE DATI TEMPORALI
-# ==========================================
-print("4. Calcolo Dominio e Timeline...")
-
-df = df.sort_values(by='Timestamp')
-timeline_dates = df['Timestamp'].dt.strftime('%Y-%m-%d %H:%M').unique().tolist()
-
-data_by_time = {}      # I marker
-dominance_by_time = {} # Chi comanda quale stato
-user_totals_by_time = {} # Totali per classifica utenti
-
-# Struttura accumulo: { 'Italy': { 'Cosimo': 5, 'Leo': 2 }, ... }
-geo_dominance_accum = {}
-user_counts_accum = {u: 0 for u in unique_users}
+def main():
+    # Librerie pesanti importate solo quando lo script gira davvero (importarlo non costa nulla)
+    import pandas as pd
+    import numpy as np
+    import folium
+    import requests
+    from shapely.geometry import shape, Point
+    from shapely.prepared import prep
+
+    FILE_NAME = '_chat.txt'
+    if not os.path.exists(FILE_NAME):
+        print(f"⚠️ ERRORE: '{FILE_NAME}' mancante!")
+        return
+
+    print("1. Lettura chat...")
+    with open(FILE_NAME, 'r', encoding='utf-8') as f: chat_content = f.read()
+
+    matches = re.findall(r"^\[(\d{2}\/\d{2}\/\d{2}),\s(\d{2}:\d{2}:\d{2})\]\s([^:]+):\s(.*)$", chat_content, re.MULTILINE)
+    data = [{'Date_Str': m[0], 'Time_Str': m[1], 'User': m[2].strip(), 'Message_Content': m[3].strip()} for m in matches]
+    df = pd.DataFrame(data)
+    df['Timestamp'] = pd.to_datetime(df['Date_Str'] + ' ' + df['Time_Str'], format='%d/%m/%y %H:%M:%S', errors='coerce')
+    df['Is_Poop'] = df['Message_Content'].str.contains('💩', regex=False)
+
+    # Logica Estrazione Posizione
+    df['Location'] = np.where(
+        (df['Message_Content'].str.contains(r'Posizione:|maps', regex=True).shift(-1) == True) & 
+        (df['User'].shift(-1) == df['User']), 
+        df['Message_Content'].shift(-1), None
+    )
+    df = df[df['Is_Poop'] == True].copy()
+
+    def get_coords(text):
+        match = re.search(r'(-?\d+\.\d+),\s*(-?\d+\.\d+)', str(text))
+        return (float(match.group(1)), float(match.group(2))) if match else (np.nan, np.nan)
+
+    df[['Latitude', 'Longitude']] = df['Location'].apply(get_coords).apply(pd.Series)
+    df = df.dropna(subset=['Latitude', 'Longitude'])
+
+    # Mapping Utenti
+    user_mapping = {
+        'cosimobicci': 'Cosimo', 'riki nata': 'Riccardo', 'Federation non è rotto qualcosa Yonghong': 'Armando',
+        'Maurizio dalla sezione Marketing': 'Tommaso', 'Asia Mariani': 'Asia', 'Stefano Panichi': 'Stefano',
+        'Leo Chelsea': 'Leo', 'Luca Viezzoli': 'Luca', 'mariam': 'Mariam', 'Francesca Piersigilli': 'Francesca'
+    }
+    for k, v in user_mapping.items(): df['User'] = df['User'].str.replace(k, v, regex=False)
+    unique_users = sorted(df['User'].unique())
+
+    # ==========================================
+    # 🌍 3. GEOMETRIA & LOGICA DOMINIO
+    # ==========================================
+    print("2. Setup GeoJSON e Poligoni...")
+    try:
+        if not os.path.exists("world_hires.json"):
+            r = requests.get(GEOJSON_URL)
+            geo_data = r.json()
+            with open("world_hires.json", "w") as f: json.dump(geo_data, f)
+        else:
+            with open("world_hires.json", "r") as f: geo_data = json.load(f)
+    except Exception as e:
+        geo_data = requests.get(GEOJSON_URL).json()
+
+    # Prepara poligoni per ricerca veloce
+    countries_polys = []
+    for feature in geo_data['features']:
+        geom = shape(feature['geometry'])
+        name = feature['properties'].get('ADMIN', feature['properties'].get('NAME', 'Unknown'))
+        countries_polys.append({'name': name, 'poly': prep(geom)}) 
+
+    def get_country(lat, lon):
+        p = Point(lon, lat)
+        for c in countries_polys:
+            if c['poly'].contains(p): return c['name']
+        return "Unknown"
+
+    print("3. Assegnazione Stati ai Punti...")
+    df['Country'] = df.apply(lambda row: get_country(row['Latitude'], row['Longitude']), axis=1)
+
+    # ==========================================
+    # 📊 4. ELABORAZIONE DATI TEMPORALI
+    # ==========================================
+    print("4. Calcolo Dominio e Timeline...")
+
+    df = df.sort_values(by='Timestamp')
+    # Chiave al minuto calcolata una sola volta, poi raggruppamento in un'unica passata
+    time_keys = df['Timestamp'].dt.strftime('%Y-%m-%d %H:%M')
+    timeline_dates = time_keys.unique().tolist()
+    rows_by_time = time_keys.groupby(time_keys, sort=False).indices
+
+    users = df['User'].tolist()
+    countries = df['Country'].tolist()
+    lats = df['Latitude'].tolist()
+    lons = df['Longitude'].tolist()
+    keys = time_keys.tolist()
+
+    data_by_time = {}      # I marker
+    dominance_by_time = {} # Chi comanda quale stato
+    user_totals_by_time = {} # Totali per classifica utenti
+
+    # Struttura accumulo: { 'Italy': { 'Cosimo': 5, 'Leo': 2 }, ... }
+    geo_dominance_accum = {}
+    current_map_colors = {}
+    user_counts_accum = {u: 0 for u in unique_users}
 
-for time_val in timeline_dates:
-    current_slice = df[df['Timestamp'].dt.strftime('%Y-%m-%d %H:%M') == time_val]
+    for time_val in timeline_dates:
+        rows = rows_by_time.get(time_val, ())
     
-    # Aggiorna statistiche dominio
-    for _, row in current_slice.iterrows():
-        u = row['User']
-        c = row['Country']
-        user_counts_accum[u] += 1
+        # Aggiorna statistiche dominio
+        touched = []
+        for i in rows:
+            u = users[i]
+            c = countries[i]
+            user_counts_accum[u] += 1
         
-        if c != "Unknown":
-            if c not in geo_dominance_accum: geo_dominance_accum[c] = {}
-            geo_dominance_accum[c][u] = geo_dominance_accum[c].get(u, 0) + 1
+            if c != "Unknown":
+                if c not in geo_dominance_accum:
+                    geo_dominance_accum[c] = {}
+                    current_map_colors[c] = None
+                geo_dominance_accum[c][u] = geo_dominance_accum[c].get(u, 0) + 1
+                touched.append(c)
     
-    # Calcola chi vince in ogni stato IN QUESTO MOMENTO
-    current_map_colors = {}
-    for country, contenders in geo_dominance_accum.items():
-        # Trova utente con max cagate
-        winner = max(contenders, key=contenders.get)
-        winner_color = PASTEL_HEX_MAP.get(USER_CONFIG.get(winner, {}).get('color'), '#333')
-        current_map_colors[country] = winner_color
+        # Calcola chi vince negli stati toccati IN QUESTO MOMENTO (gli altri non cambiano)
+        for country in touched:
+            contenders = geo_dominance_accum[country]
+            # Trova utente con max cagate
+            winner = max(contenders, key=contenders.get)
+            current_map_colors[country] = PASTEL_HEX_MAP.get(USER_CONFIG.get(winner, {}).get('color'), '#333')
         
-    dominance_by_time[time_val] = current_map_colors
-    user_totals_by_time[time_val] = user_counts_accum.copy()
+        dominance_by_time[time_val] = current_map_colors.copy()
+        user_totals_by_time[time_val] = user_counts_accum.copy()
     
-    # Marker
-    features_slice = []
-    for _, row in current_slice.iterrows():
-        user = row['User']
-        color = PASTEL_HEX_MAP.get(USER_CONFIG.get(user, {}).get('color', 'gray'), 'gray')
-        popup = f"<b>{user}</b><br>{row['Country']}<br>{row['Timestamp'].strftime('%H:%M')}"
-        features_slice.append({
-            "lat": row['Latitude'], "lon": row['Longitude'],
-            "user": user, "hex_color": color, 
-            "safe_class": sanitize_class_name(user),
-            "popup": popup
-        })
-    data_by_time[time_val] = features_slice
-
-# JSON Dumps
-js_timeline = json.dumps(timeline_dates)
-js_point_data = json.dumps(data_by_time)
-js_dominance = json.dumps(dominance_by_time)
-js_user_totals = json.dumps(user_totals_by_time)
-js_user_colors = json.dumps({u: PASTEL_HEX_MAP.get(USER_CONFIG.get(u, {}).get('color'), 'gray') for u in unique_users})
-
-# ==========================================
-# 🗺️ 5. UI COMPLETA (Tutte le finestre)
-# ==========================================
-
-m = folium.Map(location=[45.0, 10.0], zoom_start=4, tiles="CartoDB dark_matter", zoom_control=False, world_copy_jump=True, min_zoom=2)
-
-# GeoJSON Layer (Inizialmente vuoto/nero)
-folium.GeoJson(
-    geo_data,
-    name="Stati",
-    style_function=lambda x: {'fillColor': '#222', 'color': '#444', 'weight': 0.5, 'fillOpacity': 0.1},
-    tooltip=folium.GeoJsonTooltip(fields=['ADMIN'], aliases=['Stato:'])
-).add_to(m)
-
-map_id = m.get_name()
-
-# 1. Pannello Membri (Filtri)
-legend_items = "".join([f"""
+        # Marker
+        features_slice = []
+        for i in rows:
+            user = users[i]
+            color = PASTEL_HEX_MAP.get(USER_CONFIG.get(user, {}).get('color', 'gray'), 'gray')
+            popup = f"<b>{user}</b><br>{countries[i]}<br>{keys[i][-5:]}"
+            features_slice.append({
+                "lat": lats[i], "lon": lons[i],
+                "user": user, "hex_color": color, 
+                "safe_class": sanitize_class_name(user),
+                "popup": popup
+            })
+        data_by_time[time_val] = features_slice
+
+    # JSON Dumps
+    js_timeline = json.dumps(timeline_dates)
+    js_point_data = json.dumps(data_by_time)
+    js_dominance = json.dumps(dominance_by_time)
+    js_user_totals = json.dumps(user_totals_by_time)
+    js_user_colors = json.dumps({u: PASTEL_HEX_MAP.get(USER_CONFIG.get(u, {}).get('color'), 'gray') for u in unique_users})
+
+    # ==========================================
+    # 🗺️ 5. UI COMPLETA (Tutte le finestre)
+    # ==========================================
+
+    m = folium.Map(location=[45.0, 10.0], zoom_start=4, tiles="CartoDB dark_matter", zoom_control=False, world_copy_jump=True, min_zoom=2)
+
+    # GeoJSON Layer (Inizialmente vuoto/nero)
+    folium.GeoJson(
+        geo_data,
+        name="Stati",
+        style_function=lambda x: {'fillColor': '#222', 'color': '#444', 'weight': 0.5, 'fillOpacity': 0.1},
+        tooltip=folium.GeoJsonTooltip(fields=['ADMIN'], aliases=['Stato:'])
+    ).add_to(m)
+
+    map_id = m.get_name()
+
+    # 1. Pannello Membri (Filtri)
+    legend_items = "".join([f"""
     <div style="display:flex; align-items:center; margin-bottom:5px;">
         <input type="checkbox" id="chk_{sanitize_class_name(u)}" checked onclick="toggleUser('{sanitize_class_name(u)}')" style="margin-right:8px; accent-color:{PASTEL_HEX_MAP.get(USER_CONFIG.get(u,{}).get('color'),'#888')};">
         <span style="width:10px; height:10px; background:{PASTEL_HEX_MAP.get(USER_CONFIG.get(u,{}).get('color'),'#888')}; border-radius:50%; margin-right:8px;"></span>
         <label for="chk_{sanitize_class_name(u)}" style="font-size:12px; cursor:pointer;">{u}</label>
     </div>""" for u in unique_users])
 
-right_panel = f"""
+    right_panel = f"""
 <div id="filter-legend" class="glass-panel" style="position:fixed; top:20px; right:20px; z-index:1000; max-height:80vh; overflow-y:auto; min-width:150px;">
     <div class="draggable-header">👥 Membri</div>
     {legend_items}
 </div>
 """
 
-# 2. Pannello Premi (Awards)
-awards_items = "".join([f"""
+    # 2. Pannello Premi (Awards)
+    awards_items = "".join([f"""
     <div style="margin-bottom:6px; border-bottom:1px solid rgba(255,255,255,0.1); padding-bottom:4px;">
         <div style="display:flex; justify-content:space-between; align-items:center;">
             <span style="font-size:14px; margin-right:5px;">{icon}</span>
@@ -222,15 +238,15 @@ awards_items = "".join([f"""
         </div>
     </div>""" for _, (title, icon, xp) in sorted(AWARDS_CONFIG.items(), key=lambda x: x[1][2], reverse=True)])
 
-left_panel = f"""
+    left_panel = f"""
 <div id="awards-legend" class="glass-panel" style="position:fixed; top:20px; left:20px; z-index:1000; max-height:60vh; overflow-y:auto; width:220px;">
     <div class="draggable-header">🏆 Guida XP</div>
     {awards_items}
 </div>
 """
 
-# 3. Pannello Classifica Utenti (Chart)
-chart_panel = f"""
+    # 3. Pannello Classifica Utenti (Chart)
+    chart_panel = f"""
 <div id="chart-panel" class="glass-panel" style="position:fixed; bottom:120px; right:20px; z-index:1000; width:240px;">
     <div class="draggable-header">📊 Classifica Live</div>
     <div id="chart-container" style="padding-top:5px;"></div>
@@ -238,8 +254,8 @@ chart_panel = f"""
 <style id="dynamic-user-styles"></style>
 """
 
-# 4. Slider
-slider_html = f"""
+    # 4. Slider
+    slider_html = f"""
 <div id="custom-slider-container" class="glass-panel">
     <div class="slider-controls">
         <button id="play-pause-btn" onclick="togglePlay()"><i class="fa fa-play"></i></button>
@@ -251,7 +267,7 @@ slider_html = f"""
 </div>
 """
 
-script_js = f"""
+    script_js = f"""
 <link href="https://fonts.googleapis.com/css2?family=Poppins:wght@300;400;600&display=swap" rel="stylesheet">
 <link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css">
 <style>
@@ -461,14 +477,17 @@ script_js = f"""
 </script>
 """
 
-m.get_root().html.add_child(folium.Element(right_panel))
-m.get_root().html.add_child(folium.Element(left_panel))
-m.get_root().html.add_child(folium.Element(chart_panel))
-m.get_root().html.add_child(folium.Element(slider_html))
-m.get_root().html.add_child(folium.Element(script_js))
-
-output_file = "Mappa_Dominio_Finale.html"
-m.save(output_file)
-print(f"✅ Mappa creata: {output_file}")
-try: webbrowser.open('file://' + os.path.realpath(output_file))
-except: pass
+    m.get_root().html.add_child(folium.Element(right_panel))
+    m.get_root().html.add_child(folium.Element(left_panel))
+    m.get_root().html.add_child(folium.Element(chart_panel))
+    m.get_root().html.add_child(folium.Element(slider_html))
+    m.get_root().html.add_child(folium.Element(script_js))
+
+    output_file = "Mappa_Dominio_Finale.html"
+    m.save(output_file)
+    print(f"✅ Mappa creata: {output_file}")
+    try: webbrowser.open('file://' + os.path.realpath(output_file))
+    except: pass
+
+if __name__ == "__main__":
+    main()
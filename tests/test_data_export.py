@@ -0,0 +1,36 @@
+import os
+import sys
+import gzip
+import json
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_export import MISSING_MINUTE, write_data_files
+from data_loader import concat_batches, normalize_users, parse_lines
+from timeline import build_timeline
+
+# Due cagate con posizione, la seconda con una data che non esiste (31/02): Timestamp NaT
+CHAT = """[01/01/22, 10:00:00] Anna: 💩
+[01/01/22, 10:00:20] Anna: Posizione: https://maps.google.com/?q=45.0,9.0
+[31/02/22, 11:00:00] Bruno: 💩
+[31/02/22, 11:00:30] Bruno: Posizione: https://maps.google.com/?q=41.9,12.5
+"""
+
+def test_step_without_time(tmp_path):
+    batches, _, _, _ = parse_lines(CHAT.splitlines(keepends=True))
+    df = normalize_users(concat_batches(batches))
+    df['Country'] = 'Italy'
+    assert df['Timestamp'].isna().sum() == 1
+
+    timeline = build_timeline(df, sorted(df['User'].unique()))
+    manifest = write_data_files(df, timeline, str(tmp_path))
+
+    assert manifest['n_steps'] == 2 and manifest['n_points'] == 1
+    with open(tmp_path / 'data' / manifest['chunks'][0]['points'], 'rb') as f:
+        points = gzip.decompress(f.read())
+    minutes = np.frombuffer(points[:4 * manifest['n_steps']], dtype=np.int32)
+    assert minutes[0] == np.datetime64('2022-01-01T10:00', 'm').astype(np.int64)
+    assert minutes[1] == MISSING_MINUTE
+    with open(tmp_path / 'data' / manifest['chunks'][0]['steps_file'], 'rb') as f:
+        assert len(json.loads(gzip.decompress(f.read()))['dominance']['deltas']) == 2
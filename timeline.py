@@ -0,0 +1,231 @@
+import numpy as np
+import pandas as pd
+from config import PASTEL_HEX_MAP, USER_CONFIG, sanitize_class_name
+from awards import AwardsEngine
+from dominance import DominanceEngine
+from event_store import event_coords
+
+TIME_FORMAT = '%Y-%m-%d %H:%M'
+# Ogni quanti step il frontend riceve lo stato completo (tra un keyframe e l'altro solo le variazioni)
+KEYFRAME_EVERY = 100
+# Granularità della timeline: formato dell'etichetta con cui si raggruppano gli step al minuto
+# (in alternativa un numero intero = N eventi per step)
+GRANULARITY_FORMATS = {'minute': TIME_FORMAT, 'hour': '%Y-%m-%d %H:00', 'day': '%Y-%m-%d', 'week': '%G-W%V', 'month': '%Y-%m'}
+
+def build_timeline(df, unique_users):
+    print("⏳ Calcolo Dominio e Timeline...")
+    return TimelineBuilder(unique_users).add(df)
+
+def encode_deltas(changes, initial=None, keyframe_every=KEYFRAME_EVERY, start=0):
+    # Stato allo step i = keyframes[i // keyframe_every] + deltas degli step successivi al keyframe fino a i.
+    # Con start > 0 solo la coda (initial = stato prima di start): keyframe da ceil(start / keyframe_every), deltas da start
+    state = dict(initial or {})
+    keyframes = []
+    for i in range(start, len(changes)):
+        state.update(changes[i])
+        if i % keyframe_every == 0:
+            keyframes.append(dict(state))
+    return {'keyframe_every': keyframe_every, 'keyframes': keyframes, 'deltas': changes[start:] if start else changes}
+
+def parse_granularity(value):
+    # 'day' -> 'day', '50' o 50 -> 50 eventi per step
+    if isinstance(value, int) or str(value).isdigit():
+        if int(value) < 1:
+            raise ValueError("Servono almeno 1 evento per step")
+        return int(value)
+    if value not in GRANULARITY_FORMATS:
+        raise ValueError(f"Granularità sconosciuta: {value} (disponibili: {', '.join(GRANULARITY_FORMATS)} o un numero di eventi per step)")
+    return value
+
+def rollup_steps(dates, step_ends, granularity):
+    # Gruppi di step al minuto consecutivi nella granularità richiesta: (etichetta, ultimo step al minuto) per gruppo.
+    # Lo stato cumulato di un gruppo è quello del suo ultimo step, quindi non serve ricalcolare nulla
+    granularity = parse_granularity(granularity)
+    dates = pd.Series(dates, dtype=object)
+    if granularity == 'minute':
+        return dates.tolist(), list(range(len(dates)))
+    if isinstance(granularity, int):
+        # Un minuto non si divide: il gruppo si chiude allo step in cui il totale supera il multiplo di N
+        codes = np.maximum(np.asarray(step_ends, dtype=np.int64) - 1, 0) // granularity
+        labels = dates.ffill()
+    else:
+        labels = pd.to_datetime(dates, format=TIME_FORMAT).dt.strftime(GRANULARITY_FORMATS[granularity])
+        codes = pd.factorize(labels, use_na_sentinel=False)[0]
+    last = np.r_[np.flatnonzero(np.diff(codes)), len(codes) - 1] if len(codes) else np.zeros(0, dtype=np.int64)
+    return labels.iloc[last].tolist(), last.tolist()
+
+class TimelineBuilder:
+    # Stato degli accumulatori tenuto tra un'esecuzione e l'altra (modalità incrementale)
+    def __init__(self, unique_users):
+        self.unique_users = list(unique_users)
+        self.timeline_dates = []
+        self.data_by_time = {}
+        # Dominio e classifica salvati come variazioni per step: lo stato completo si ricostruisce in result()
+        self.dominance_changes = []
+        self.user_totals_changes = []
+        self.dominance = DominanceEngine(len(self.unique_users))
+        # XP totale per utente e detentore di ogni premio, anche questi come variazioni per step
+        self.xp_changes = []
+        self.award_changes = []
+        self.awards = AwardsEngine(len(self.unique_users))
+        # Stesso dominio per regione (admin-1), se gli eventi hanno la colonna Region
+        self.region_changes = []
+        self.region_dominance = DominanceEngine(len(self.unique_users))
+        self.has_regions = False
+        self.user_counts_accum = {u: 0 for u in unique_users}
+        self.last_timestamp = None
+        self.has_missing_time = False
+
+    def can_extend(self, df):
+        # Si riprende solo se i nuovi eventi vengono dopo gli ultimi e non ci sono utenti nuovi
+        if self.has_missing_time or df['Timestamp'].isna().any():
+            return False
+        if not set(df['User']).issubset(self.user_counts_accum):
+            return False
+        return self.last_timestamp is None or len(df) == 0 or df['Timestamp'].min() >= self.last_timestamp
+
+    def add(self, df):
+        df = df.sort_values(by='Timestamp', kind='stable')
+
+        # Minuto di ogni riga come intero (datetime64[m]): le etichette si formattano solo per i minuti distinti.
+        # Essendo ordinate, le righe di ogni step sono contigue; le righe senza orario hanno step -1
+        minutes = df['Timestamp'].to_numpy().astype('datetime64[m]')
+        local_steps, step_minutes = pd.factorize(minutes)
+        new_dates = pd.DatetimeIndex(step_minutes).strftime(TIME_FORMAT).tolist()
+        timed = local_steps >= 0
+        if not timed.all():
+            # Step "senza orario" in coda, come faceva la chiave testuale (NaN tra le date)
+            new_dates.append(float('nan'))
+        bounds = np.searchsorted(local_steps[timed], np.arange(len(new_dates) + 1)).tolist()
+
+        # Utenti e stati come codici (categorie della tabella compatta): i nomi si leggono da liste piccole
+        user_codes = pd.Categorical(df['User'], categories=self.unique_users).codes.astype(np.int64)
+        countries = pd.Categorical(df['Country'])
+        country_names = countries.categories.tolist()
+        country_codes = countries.codes.tolist()
+        lat_array, lon_array = event_coords(df)
+        lats = lat_array.tolist()
+        lons = lon_array.tolist()
+        users = user_codes.tolist()
+        steps = local_steps.tolist()
+        names = self.unique_users
+
+        # Colori e classi CSS per utente (invece che per riga)
+        marker_style = [(PASTEL_HEX_MAP.get(USER_CONFIG.get(u, {}).get('color', 'gray'), 'gray'), sanitize_class_name(u)) for u in names]
+        winner_colors = [PASTEL_HEX_MAP.get(USER_CONFIG.get(u, {}).get('color'), '#333') for u in names]
+
+        # Dominio vettorizzato: indice di step e codice utente per ogni riga (le righe senza orario non contano)
+        merge_first = bool(self.timeline_dates) and len(new_dates) > 0 and self.timeline_dates[-1] == new_dates[0]
+        base_step = len(self.timeline_dates) - (1 if merge_first else 0)
+        step_changes = self._dominance_changes(self.dominance, base_step + local_steps[timed], countries[timed],
+                                               user_codes[timed], winner_colors)
+        region_step_changes = {}
+        if 'Region' in df:
+            self.has_regions = True
+            region_step_changes = self._dominance_changes(self.region_dominance, base_step + local_steps[timed],
+                                                          pd.Categorical(df['Region'])[timed], user_codes[timed], winner_colors)
+
+        # Premi e XP vettorizzati sullo stesso blocco (uno step del blocco = uno step della timeline)
+        _, xp, holders = self.awards.add(local_steps[timed], user_codes[timed], countries[timed], lat_array[timed], lon_array[timed])
+        xp_codes, award_codes = self.awards.changes(xp, holders)
+
+        user_counts_accum = self.user_counts_accum
+
+        for j, time_val in enumerate(new_dates):
+            rows = range(bounds[j], bounds[j + 1])
+
+            # Aggiorna totali utenti
+            totals_changes = {}
+            for i in rows:
+                user = names[users[i]]
+                user_counts_accum[user] += 1
+                totals_changes[user] = user_counts_accum[user]
+
+            step = len(self.timeline_dates) - (1 if self.timeline_dates and self.timeline_dates[-1] == time_val else 0)
+            changes = step_changes.get(step, {})
+            region_changes = region_step_changes.get(step, {})
+
+            # Preparazione Markers
+            features_slice = []
+            for i in rows:
+                user = names[users[i]]
+                color, safe_class = marker_style[users[i]]
+                popup = f"<b>{user}</b><br>{country_names[country_codes[i]]}<br>{new_dates[steps[i]][-5:]}"
+                features_slice.append({
+                    "lat": lats[i], "lon": lons[i],
+                    "user": user, "hex_color": color,
+                    "safe_class": safe_class,
+                    "popup": popup
+                })
+
+            # (lo step "senza orario" in coda, se c'è, non ha eventi e quindi nessuna variazione)
+            xp_changes = {self.unique_users[u]: v for u, v in xp_codes[j].items()} if j < len(xp_codes) else {}
+            award_changes = {k: (self.unique_users[u] if u >= 0 else None) for k, u in award_codes[j].items()} if j < len(award_codes) else {}
+
+            # Stesso minuto dell'ultimo step già calcolato: lo step si estende invece di duplicarsi
+            if self.timeline_dates and self.timeline_dates[-1] == time_val:
+                self.data_by_time[time_val].extend(features_slice)
+                self.dominance_changes[-1].update(changes)
+                self.region_changes[-1].update(region_changes)
+                self.user_totals_changes[-1].update(totals_changes)
+                self.xp_changes[-1].update(xp_changes)
+                self.award_changes[-1].update(award_changes)
+            else:
+                self.timeline_dates.append(time_val)
+                self.data_by_time[time_val] = features_slice
+                self.dominance_changes.append(changes)
+                self.region_changes.append(region_changes)
+                self.user_totals_changes.append(totals_changes)
+                self.xp_changes.append(xp_changes)
+                self.award_changes.append(award_changes)
+
+        if df['Timestamp'].isna().any():
+            self.has_missing_time = True
+        if df['Timestamp'].notna().any():
+            self.last_timestamp = df['Timestamp'].max()
+        return self
+
+    def _dominance_changes(self, engine, steps, places, users, winner_colors):
+        # {step: {stato o regione: colore del nuovo dominatore}}, solo dove il dominatore cambia
+        changes = {}
+        for step, code, winner in engine.add(steps, places, users).T.tolist():
+            changes.setdefault(step, {})[engine.country_names[code]] = winner_colors[winner]
+        return changes
+
+    def result(self):
+        # Stato completo per ogni step (formato storico, un dict per data)
+        dominance_by_time = {}
+        user_totals_by_time = {}
+        map_colors = {}
+        totals = {u: 0 for u in self.unique_users}
+        for time_val, changes, totals_changes in zip(self.timeline_dates, self.dominance_changes, self.user_totals_changes):
+            map_colors.update(changes)
+            totals.update(totals_changes)
+            dominance_by_time[time_val] = map_colors.copy()
+            user_totals_by_time[time_val] = totals.copy()
+        return self.timeline_dates, self.data_by_time, dominance_by_time, user_totals_by_time
+
+    def step_ends(self):
+        # Fine cumulata dei punti di ogni step (i punti sono in ordine di tempo)
+        return np.cumsum([len(self.data_by_time[d]) for d in self.timeline_dates], dtype=np.int64)
+
+    def rollup(self, granularity):
+        return rollup_steps(self.timeline_dates, self.step_ends(), granularity)
+
+    def awards_payload(self, keyframe_every=KEYFRAME_EVERY):
+        # XP per utente e detentori dei premi, stesso formato keyframe + variazioni
+        xp = encode_deltas(self.xp_changes, {u: 0 for u in self.unique_users}, keyframe_every)
+        awards = encode_deltas(self.award_changes, keyframe_every=keyframe_every)
+        return xp, awards
+
+    def region_payload(self, keyframe_every=KEYFRAME_EVERY):
+        # Dominio per regione nello stesso formato del dominio per stato (None senza regioni)
+        if not self.has_regions:
+            return None
+        return encode_deltas(self.region_changes, keyframe_every=keyframe_every)
+
+    def payload(self, keyframe_every=KEYFRAME_EVERY):
+        # Formato compatto per la mappa: keyframe periodici + variazioni per step, indicizzati per posizione
+        dominance = encode_deltas(self.dominance_changes, keyframe_every=keyframe_every)
+        totals = encode_deltas(self.user_totals_changes, {u: 0 for u in self.unique_users}, keyframe_every)
+        return self.timeline_dates, self.data_by_time, dominance, totals